@@ -43,6 +43,7 @@ from apps.clinics.models import Clinic, ClinicService, ServiceHours, LanguageCho
 from apps.common.api import error_response, ok_response
 from apps.conversations.models import Conversation, ConversationMessage, MessageDirection
 from apps.kb.models import KnowledgeChunk, KnowledgeDocument, KnowledgeIndex
+from apps.kb.services import bump_kb_version
 from apps.templates.models import MessageTemplate, TemplateCategory
 from apps.channels.services import (
     DEFAULT_SESSION_FALLBACK_HSM,
@@ -1793,7 +1794,9 @@ def _serialize_outbox(outbox: OutboxMessage) -> Dict[str, object]:
         OutboxStatus.CANCELLED: "FAILED",
     }
     state = state_map.get(outbox.status, "QUEUED")
-    provider_message_id = outbox.payload.get("provider_message_id") if isinstance(outbox.payload, dict) else None
+    provider_message_id = outbox.provider_message_id or (
+        outbox.payload.get("provider_message_id") if isinstance(outbox.payload, dict) else None
+    )
     return {
         "id": outbox.id,
         "message_type": outbox.message_type,
@@ -2050,6 +2053,7 @@ class ClinicKnowledgeUploadView(APIView):
                     },
                 )
                 KnowledgeChunk.objects.filter(document=doc).delete()
+        bump_kb_version(clinic.id)
 
         return ok_response({"documents": len(documents)})
 
@@ -2096,6 +2100,7 @@ class ClinicKnowledgePublishView(APIView):
             index.documents.set(clinic.knowledge_documents.all())
             index.last_synced_at = timezone.now()
             index.save(update_fields=["last_synced_at", "updated_at"])
+        bump_kb_version(clinic.id)
 
         return ok_response({"published": pending.count(), "chunks": total_chunks})
 
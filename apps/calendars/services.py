@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 import json
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import Any, Dict, Tuple
 from uuid import uuid4
 
@@ -11,11 +11,35 @@ import requests
 from django.conf import settings
 from django.urls import reverse
 from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from apps.appointments.models import Appointment
 from apps.calendars.models import CalendarEvent, GoogleCredential
 
 
+def _build_session() -> requests.Session:
+    """Keep-alive session shared by all Google API calls in this process."""
+    session = requests.Session()
+    # urllib3 only retries idempotent methods by default, so event creation is never replayed;
+    # once retries run out the last response is returned so callers raise GoogleCalendarServiceError
+    retries = Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[429, 502, 503, 504],
+        raise_on_status=False,
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retries))
+    return session
+
+
+_session = _build_session()
+
+
+def _parse_google_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+
 class GoogleCalendarServiceError(RuntimeError):
     """Raised when Google Calendar integration fails."""
 
@@ -46,7 +70,7 @@ class GoogleCalendarService:
             "redirect_uri": settings.GOOGLE_REDIRECT_URI,
             "grant_type": "authorization_code",
         }
-        response = requests.post(self.TOKEN_URL, data=payload, timeout=15)
+        response = _session.post(self.TOKEN_URL, data=payload, timeout=15)
         if response.status_code >= 400:
             raise GoogleCalendarServiceError(response.text)
         data = response.json()
@@ -70,7 +94,7 @@ class GoogleCalendarService:
     def create_event(self, appointment: Appointment, credential: GoogleCredential) -> CalendarEvent:
         payload = self._appointment_to_payload(appointment)
         headers = {"Authorization": f"Bearer {credential.get_access_token()}", "Content-Type": "application/json"}
-        response = requests.post(
+        response = _session.post(
             f"{self.CALENDAR_API}/calendars/{credential.calendar_id}/events",
             json=payload,
             headers=headers,
@@ -98,7 +122,7 @@ class GoogleCalendarService:
 
     def cancel_event(self, calendar_event: CalendarEvent, credential: GoogleCredential) -> None:
         headers = {"Authorization": f"Bearer {credential.get_access_token()}", "Content-Type": "application/json"}
-        response = requests.delete(
+        response = _session.delete(
             f"{self.CALENDAR_API}/calendars/{credential.calendar_id}/events/{calendar_event.external_event_id}",
             headers=headers,
             timeout=15,
@@ -132,7 +156,7 @@ class GoogleCalendarService:
             "timeZone": credential.clinic.tz if hasattr(credential, "clinic") else "UTC",
             "items": [{"id": credential.calendar_id}],
         }
-        response = requests.post(
+        response = _session.post(
             f"{self.CALENDAR_API}/freeBusy",
             json=payload,
             headers=headers,
@@ -146,15 +170,11 @@ class GoogleCalendarService:
             credential.save(update_fields=["last_error", "last_error_at", "updated_at"])
             raise GoogleCalendarServiceError(response.text)
         busy_data = response.json().get("calendars", {}).get(credential.calendar_id, {}).get("busy", [])
-        windows: list[tuple[datetime, datetime]] = []
-        for entry in busy_data:
-            start_str = entry.get("start")
-            end_str = entry.get("end")
-            if not start_str or not end_str:
-                continue
-            start_dt = datetime.fromisoformat(start_str.replace("Z", "+00:00")).astimezone(timezone.utc)
-            end_dt = datetime.fromisoformat(end_str.replace("Z", "+00:00")).astimezone(timezone.utc)
-            windows.append((start_dt, end_dt))
+        windows: list[tuple[datetime, datetime]] = [
+            (_parse_google_timestamp(entry["start"]), _parse_google_timestamp(entry["end"]))
+            for entry in busy_data
+            if entry.get("start") and entry.get("end")
+        ]
         credential.last_free_busy_at = timezone.now()
         credential.last_error = ""
         credential.last_error_at = None
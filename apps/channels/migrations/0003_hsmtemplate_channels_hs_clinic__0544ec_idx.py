@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0002_hsmtemplate_remove_outboxmessage_template_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hsmtemplate',
+            index=models.Index(fields=['clinic', 'name', 'language', 'status'], name='channels_hs_clinic__0544ec_idx'),
+        ),
+    ]
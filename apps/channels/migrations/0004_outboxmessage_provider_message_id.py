@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-16 04:54
+
+from django.db import migrations, models
+
+
+def backfill_provider_message_id(apps, schema_editor):
+    OutboxMessage = apps.get_model("channels", "OutboxMessage")
+    batch = []
+    rows = OutboxMessage.objects.filter(payload__has_key="provider_message_id").only("id", "payload")
+    for outbox in rows.iterator(chunk_size=1000):
+        outbox.provider_message_id = outbox.payload.get("provider_message_id") or None
+        batch.append(outbox)
+        if len(batch) >= 1000:
+            OutboxMessage.objects.bulk_update(batch, ["provider_message_id"])
+            batch = []
+    if batch:
+        OutboxMessage.objects.bulk_update(batch, ["provider_message_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0003_hsmtemplate_channels_hs_clinic__0544ec_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='provider_message_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_provider_message_id, migrations.RunPython.noop),
+    ]
@@ -80,6 +80,9 @@ class HSMTemplate(TimeStampedModel):
     class Meta:
         unique_together = ("clinic", "name", "language")
         ordering = ["clinic_id", "name"]
+        indexes = [
+            models.Index(fields=["clinic", "name", "language", "status"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} ({self.language})"
@@ -122,6 +125,7 @@ class OutboxMessage(TimeStampedModel):
     sent_at = models.DateTimeField(null=True, blank=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
     idempotency_key = models.CharField(max_length=255, blank=True, null=True, unique=True)
+    provider_message_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     metadata = models.JSONField(default=dict, blank=True)
 
     class Meta:
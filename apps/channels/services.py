@@ -9,7 +9,7 @@ from typing import Optional
 from uuid import uuid4
 
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 from apps.channels.models import (
@@ -25,6 +25,7 @@ from apps.conversations.models import Conversation, ConversationMessage
 SESSION_WINDOW_HOURS = int(getattr(settings, "WHATSAPP_SESSION_WINDOW_HOURS", 24))
 MAX_INITIAL_DELAY_SECONDS = int(getattr(settings, "WHATSAPP_MAX_INITIAL_DELAY_SECONDS", 10))
 DEFAULT_MAX_ATTEMPTS = int(getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_BULK_BATCH_SIZE = int(getattr(settings, "OUTBOX_BULK_BATCH_SIZE", 500))
 DEFAULT_SESSION_FALLBACK_HSM = getattr(
     settings, "WHATSAPP_SESSION_FALLBACK_HSM_NAME", "session_clarify"
 )
@@ -37,6 +38,42 @@ def _render_body(body: str, variables: dict[str, str]) -> str:
     return result
 
 
+def _deferred_hsm_payload(hsm_template: HSMTemplate, variables: dict[str, str]) -> dict:
+    """Payload stub persisted on the request path; the body is rendered by a worker."""
+    return {
+        "deferred": True,
+        "template_id": hsm_template.provider_template_id,
+        "template_name": hsm_template.name,
+        "variables": variables,
+    }
+
+
+def render_deferred_payload(outbox: OutboxMessage, *, save: bool = True) -> bool:
+    """Render a deferred HSM body in place. Returns True when the payload changed.
+
+    With ``save=False`` only the instance changes; the caller writes it back.
+    """
+    payload = outbox.payload or {}
+    if not payload.get("deferred") or outbox.hsm_template is None:
+        return False
+    variables = payload.get("variables") or {}
+    outbox.payload = {
+        "template_id": payload.get("template_id") or outbox.hsm_template.provider_template_id,
+        "body": _render_body(outbox.hsm_template.body, variables),
+        "variables": variables,
+    }
+    if save:
+        outbox.save(update_fields=["payload", "updated_at"])
+    return True
+
+
+def _schedule_payload_render(outbox: OutboxMessage) -> None:
+    from apps.workers.tasks import render_outbox_payload
+
+    outbox_id = outbox.id
+    transaction.on_commit(lambda: render_outbox_payload.delay(outbox_id))
+
+
 def _get_hsm_template(
     clinic_id: int,
     name: str,
@@ -87,6 +124,53 @@ def _build_idempotency(payload: dict) -> str:
     return hashlib.sha256(raw).hexdigest()
 
 
+def _initial_schedule(now, delay_seconds: int):
+    return now + timedelta(seconds=min(max(delay_seconds, 0), MAX_INITIAL_DELAY_SECONDS))
+
+
+def _outbox_idempotency(
+    clinic_id: int, conversation_id: int | None, payload: dict, message_type: str
+) -> str:
+    return _build_idempotency(
+        {
+            "clinic_id": clinic_id,
+            "conversation_id": conversation_id,
+            "payload": payload,
+            "message_type": message_type,
+        }
+    )
+
+
+def _template_hold_outbox(
+    clinic_id: int,
+    conversation_id: int | None,
+    hsm_name: str,
+    language: str,
+    now,
+    idempotency_key: Optional[str] = None,
+) -> OutboxMessage:
+    """Unsaved HSM row parked until the requested template is approved."""
+
+    return OutboxMessage(
+        clinic_id=clinic_id,
+        conversation_id=conversation_id,
+        message_type=MessageType.HSM,
+        channel=ChannelType.WHATSAPP,
+        hsm_template=None,
+        payload={},
+        scheduled_for=now + timedelta(minutes=5),
+        status=OutboxStatus.PENDING,
+        attempts=0,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        idempotency_key=idempotency_key or str(uuid4()),
+        metadata={
+            "queued_at": now.isoformat(),
+            "reason": "template_not_approved",
+            "requested_template": {"name": hsm_name, "language": language},
+        },
+    )
+
+
 def enqueue_whatsapp_message(
     *,
     clinic_id: int,
@@ -115,48 +199,32 @@ def enqueue_whatsapp_message(
             raise ValueError("HSM template name required for first message or outside 24h window.")
         hsm_template = _get_hsm_template(clinic_id, hsm_name, language)
         if not hsm_template:
-            metadata = {
-                "queued_at": now.isoformat(),
-                "reason": "template_not_approved",
-                "requested_template": {"name": hsm_name, "language": language},
-            }
-            return OutboxMessage.objects.create(
-                clinic_id=clinic_id,
-                conversation=conversation,
-                message_type=MessageType.HSM,
-                channel=ChannelType.WHATSAPP,
-                hsm_template=None,
-                payload={},
-                scheduled_for=now + timedelta(minutes=5),
-                status=OutboxStatus.PENDING,
-                attempts=0,
-                max_attempts=DEFAULT_MAX_ATTEMPTS,
-                idempotency_key=str(uuid4()),
-                metadata=metadata,
+            if idempotency_key:
+                held = OutboxMessage.objects.filter(idempotency_key=idempotency_key).first()
+                if held is not None:
+                    return held
+            outbox = _template_hold_outbox(
+                clinic_id,
+                conversation.id if conversation else None,
+                hsm_name,
+                language,
+                now,
+                idempotency_key=idempotency_key,
             )
+            outbox.save(force_insert=True)
+            return outbox
 
-        payload = {
-            "template_id": hsm_template.provider_template_id,
-            "body": _render_body(hsm_template.body, variables),
-            "variables": variables,
-        }
+        payload = _deferred_hsm_payload(hsm_template, variables)
         message_type = MessageType.HSM
     else:
         payload = {
             "body": message_body,
         }
 
-    scheduled_for = now + timedelta(
-        seconds=min(max(delay_seconds, 0), MAX_INITIAL_DELAY_SECONDS)
-    )
+    scheduled_for = _initial_schedule(now, delay_seconds)
     if not idempotency_key:
-        idempotency_key = _build_idempotency(
-            {
-                "clinic_id": clinic_id,
-                "conversation_id": conversation.id if conversation else None,
-                "payload": payload,
-                "message_type": message_type,
-            }
+        idempotency_key = _outbox_idempotency(
+            clinic_id, conversation.id if conversation else None, payload, message_type
         )
 
     outbox_defaults = dict(
@@ -187,11 +255,25 @@ def enqueue_whatsapp_message(
         return outbox
 
     if not created:
-        # refresh payload in case retry intention differs
-        for field, value in outbox_defaults.items():
-            setattr(outbox, field, value)
-        outbox.save()
-
+        # refresh payload in case retry intention differs, writing only changed columns
+        columns = {
+            field: value
+            for field, value in outbox_defaults.items()
+            if field not in {"conversation", "hsm_template"}
+        }
+        columns["conversation_id"] = conversation.id if conversation else None
+        columns["hsm_template_id"] = hsm_template.id if hsm_template else None
+        changed = {
+            field: value for field, value in columns.items() if getattr(outbox, field) != value
+        }
+        if changed:
+            changed["updated_at"] = now
+            OutboxMessage.objects.filter(pk=outbox.pk).update(**changed)
+            for field, value in changed.items():
+                setattr(outbox, field, value)
+
+    if hsm_template is not None:
+        _schedule_payload_render(outbox)
     return outbox
 
 
@@ -241,11 +323,77 @@ def enqueue_whatsapp_hsm(
     )
 
 
+def build_whatsapp_hsm(
+    *,
+    clinic_id: int,
+    conversation_id: int | None,
+    template_name: str,
+    language: str,
+    variables: dict[str, str],
+    delay_seconds: int = 5,
+    template_cache: Optional[dict] = None,
+) -> OutboxMessage:
+    """Unsaved counterpart of ``enqueue_whatsapp_hsm`` for callers that bulk insert.
+
+    Takes ids rather than instances so rows can be built straight from
+    ``values()``. HSM-only sends skip the session-window checks, so the row
+    matches what ``enqueue_whatsapp_message`` would create. ``template_cache``
+    memoizes the template lookup across a batch. The payload stays deferred and
+    is rendered by ``dispatch_outbox_messages`` before sending.
+    """
+
+    now = timezone.now()
+    cache_key = (clinic_id, template_name, language)
+    if template_cache is not None and cache_key in template_cache:
+        hsm_template = template_cache[cache_key]
+    else:
+        hsm_template = _get_hsm_template(clinic_id, template_name, language)
+        if template_cache is not None:
+            template_cache[cache_key] = hsm_template
+    if hsm_template is None:
+        return _template_hold_outbox(clinic_id, conversation_id, template_name, language, now)
+
+    payload = _deferred_hsm_payload(hsm_template, variables)
+    return OutboxMessage(
+        clinic_id=clinic_id,
+        conversation_id=conversation_id,
+        message_type=MessageType.HSM,
+        channel=ChannelType.WHATSAPP,
+        hsm_template=hsm_template,
+        payload=payload,
+        scheduled_for=_initial_schedule(now, delay_seconds),
+        status=OutboxStatus.PENDING,
+        attempts=0,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        idempotency_key=_outbox_idempotency(
+            clinic_id, conversation_id, payload, MessageType.HSM
+        ),
+        metadata={"variables": variables, "auto_id": str(uuid4())},
+    )
+
+
+def bulk_enqueue_outbox(messages: list[OutboxMessage]) -> int:
+    """Insert built outbox rows in batches and return how many were submitted.
+
+    Rows whose idempotency key already exists are skipped by the database.
+    """
+
+    if not messages:
+        return 0
+    OutboxMessage.objects.bulk_create(
+        messages, batch_size=OUTBOX_BULK_BATCH_SIZE, ignore_conflicts=True
+    )
+    return len(messages)
+
+
 def mark_outbox_sent(outbox: OutboxMessage, provider_message_id: str) -> None:
     outbox.status = OutboxStatus.SENT
+    outbox.provider_message_id = provider_message_id
     outbox.payload["provider_message_id"] = provider_message_id
     outbox.sent_at = timezone.now()
-    outbox.save(update_fields=["status", "payload", "sent_at", "updated_at"])
+    outbox.save(
+        update_fields=["status", "provider_message_id", "payload", "sent_at", "updated_at"]
+    )
 
 
 def mark_outbox_delivered(outbox: OutboxMessage, provider_timestamp: Optional[str] = None) -> None:
@@ -254,3 +402,41 @@ def mark_outbox_delivered(outbox: OutboxMessage, provider_timestamp: Optional[st
     if provider_timestamp:
         outbox.metadata["delivered_at_provider"] = provider_timestamp
     outbox.save(update_fields=["status", "delivered_at", "metadata", "updated_at"])
+
+
+def mark_outbox_bulk(updates: list[tuple[int, str, Optional[str]]]) -> int:
+    """Apply ``(outbox_id, status, provider_message_id)`` transitions with one bulk UPDATE."""
+
+    if not updates:
+        return 0
+    rows = OutboxMessage.objects.in_bulk([outbox_id for outbox_id, _, _ in updates])
+    now = timezone.now()
+    changed: dict[int, OutboxMessage] = {}
+    for outbox_id, status, provider_message_id in updates:
+        outbox = rows.get(outbox_id)
+        if outbox is None:
+            continue
+        outbox.status = status
+        if provider_message_id:
+            outbox.provider_message_id = provider_message_id
+            outbox.payload["provider_message_id"] = provider_message_id
+        if status == OutboxStatus.SENT:
+            outbox.sent_at = now
+        elif status == OutboxStatus.DELIVERED:
+            outbox.sent_at = outbox.sent_at or now
+            outbox.delivered_at = now
+        outbox.updated_at = now
+        changed[outbox_id] = outbox
+    OutboxMessage.objects.bulk_update(
+        list(changed.values()),
+        fields=[
+            "status",
+            "sent_at",
+            "delivered_at",
+            "provider_message_id",
+            "payload",
+            "updated_at",
+        ],
+        batch_size=OUTBOX_BULK_BATCH_SIZE,
+    )
+    return len(changed)
@@ -2,12 +2,15 @@
 
 from __future__ import annotations
 
-import json
+import asyncio
+import logging
 import uuid
 from datetime import timedelta
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict
 
-from django.http import HttpRequest, JsonResponse
+import orjson
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
@@ -17,14 +20,17 @@ from apps.channels.services import (
     enqueue_whatsapp_hsm,
     mark_outbox_delivered,
 )
-from apps.common.utils import minimal_ok
+from apps.common.utils import OrjsonResponse, minimal_ok
 from apps.conversations.models import Conversation
 from apps.dialog.orchestrator import DialogOrchestrator
 from apps.patients.models import Patient
 from apps.patients.utils import normalize_phone_number
+from apps.templates.registry import welcome_template_name
 from apps.clinics.models import Clinic
 
 
+logger = logging.getLogger(__name__)
+
 orchestrator = DialogOrchestrator()
 
 
@@ -32,81 +38,207 @@ def _get_language(message: Dict[str, Any]) -> str:
     return message.get("language", "en")
 
 
-def _ensure_conversation(clinic: Clinic, phone: str, lead_source: str) -> Conversation:
-    dedupe_key = f"{clinic.slug}:{phone}"
-    conversation, _ = Conversation.objects.get_or_create(
-        clinic=clinic,
-        dedupe_key=dedupe_key,
-        defaults={
-            "lead_source": lead_source,
-            "fsm_state": "idle",
-        },
-    )
-    return conversation
-
-
-@csrf_exempt
-@require_POST
-def whatsapp_webhook(request: HttpRequest) -> JsonResponse:
-    payload = json.loads(request.body.decode("utf-8") or "{}")
-    clinic_slug = payload.get("clinic")
-    if not clinic_slug:
-        return JsonResponse({"ok": False, "error": "clinic missing"}, status=400)
+def _load_clinic(slug: str) -> Clinic | None:
+    return Clinic.objects.filter(slug=slug).first()
 
-    try:
-        clinic = Clinic.objects.get(slug=clinic_slug)
-    except Clinic.DoesNotExist:
-        return JsonResponse({"ok": False, "error": "clinic not found"}, status=404)
 
-    WebhookEvent.objects.create(
+def _record_webhook_event(clinic: Clinic, payload: Dict[str, Any]) -> WebhookEvent:
+    return WebhookEvent.objects.create(
         clinic=clinic,
         channel=ChannelType.WHATSAPP,
         provider_event_id=payload.get("event_id") or str(uuid.uuid4()),
         payload=payload,
     )
 
-    messages = payload.get("messages", [])
+
+def _resolve_participants(
+    clinic: Clinic, messages: list[Dict[str, Any]]
+) -> Dict[str, tuple[Patient, Conversation]]:
+    """Load or create every patient/conversation in the batch with O(1) queries."""
+    first_message: Dict[str, Dict[str, Any]] = {}
     for message in messages:
         phone = normalize_phone_number(message.get("from", ""))
-        if not phone:
-            continue
-        patient, _ = Patient.objects.get_or_create(
-            clinic=clinic,
-            normalized_phone=phone,
-            defaults={
-                "full_name": message.get("name", "Guest"),
-                "phone_number": phone,
-                "language": _get_language(message),
-            },
+        if phone and phone not in first_message:
+            first_message[phone] = message
+    if not first_message:
+        return {}
+    phones = set(first_message)
+
+    patients = {
+        patient.normalized_phone: patient
+        for patient in Patient.objects.filter(clinic=clinic, normalized_phone__in=phones)
+    }
+    missing_patients = phones - patients.keys()
+    if missing_patients:
+        Patient.objects.bulk_create(
+            [
+                Patient(
+                    clinic=clinic,
+                    normalized_phone=phone,
+                    full_name=first_message[phone].get("name", "Guest"),
+                    phone_number=phone,
+                    language=_get_language(first_message[phone]),
+                )
+                for phone in missing_patients
+            ],
+            ignore_conflicts=True,
+        )
+        patients.update(
+            (patient.normalized_phone, patient)
+            for patient in Patient.objects.filter(
+                clinic=clinic, normalized_phone__in=missing_patients
+            )
         )
-        conversation = _ensure_conversation(clinic, phone, lead_source="whatsapp")
-        if not conversation.patient:
-            conversation.patient = patient
-            conversation.save(update_fields=["patient", "updated_at"])
 
-        response_text, intent = orchestrator.handle_inbound(
-            conversation,
-            body=message.get("body", ""),
-            language=_get_language(message),
+    dedupe_keys = {Conversation.build_dedupe_key(clinic, phone): phone for phone in phones}
+    conversations = {
+        dedupe_keys[conversation.dedupe_key]: conversation
+        for conversation in Conversation.objects.filter(clinic=clinic, dedupe_key__in=dedupe_keys)
+    }
+    missing_conversations = phones - conversations.keys()
+    if missing_conversations:
+        Conversation.objects.bulk_create(
+            [
+                Conversation(
+                    clinic=clinic,
+                    patient=patients.get(phone),
+                    dedupe_key=key,
+                    lead_source="whatsapp",
+                    fsm_state="idle",
+                )
+                for key, phone in dedupe_keys.items()
+                if phone in missing_conversations
+            ],
+            ignore_conflicts=True,
         )
+        conversations.update(
+            (dedupe_keys[conversation.dedupe_key], conversation)
+            for conversation in Conversation.objects.filter(
+                clinic=clinic,
+                dedupe_key__in=[
+                    key for key, phone in dedupe_keys.items() if phone in missing_conversations
+                ],
+            )
+        )
+
+    now = timezone.now()
+    unlinked: list[Conversation] = []
+    for phone, conversation in conversations.items():
+        # prime the FK caches from rows already in hand so the orchestrator never lazy-loads them
+        conversation.clinic = clinic
+        patient = patients.get(phone)
+        if patient is None:
+            continue
+        if conversation.patient_id is None:
+            conversation.patient = patient
+            conversation.updated_at = now
+            unlinked.append(conversation)
+        elif conversation.patient_id == patient.pk:
+            conversation.patient = patient
+    if unlinked:
+        Conversation.objects.bulk_update(unlinked, ["patient", "updated_at"])
+
+    return {
+        phone: (patients[phone], conversations[phone])
+        for phone in phones
+        if phone in patients and phone in conversations
+    }
+
 
-        if intent == "book" and response_text:
-            enqueue_whatsapp_hsm(
-                clinic_id=clinic.id,
-                conversation=conversation,
-                template_name="whatsapp_welcome_en" if _get_language(message) == "en" else "whatsapp_welcome_ar",
-                language=_get_language(message),
-                variables={"name": patient.full_name},
-                delay_seconds=3,
+async def _send_welcome_hsm(
+    message: Dict[str, Any], patient: Patient, conversation: Conversation
+) -> None:
+    language = _get_language(message)
+    await sync_to_async(enqueue_whatsapp_hsm, thread_sensitive=True)(
+        clinic_id=conversation.clinic_id,
+        conversation=conversation,
+        template_name=welcome_template_name(language),
+        language=language,
+        variables={"name": patient.full_name},
+        delay_seconds=3,
+    )
+
+
+_INTENT_HANDLERS: Dict[
+    str, Callable[[Dict[str, Any], Patient, Conversation], Awaitable[None]]
+] = {
+    "book": _send_welcome_hsm,
+}
+
+
+def _message_body(message: Dict[str, Any]) -> str:
+    return (message.get("body") or "").strip()
+
+
+async def _process_message(
+    message: Dict[str, Any],
+    participants: Dict[str, tuple[Patient, Conversation]],
+) -> None:
+    phone = normalize_phone_number(message.get("from", ""))
+    if phone not in participants:
+        return
+    patient, conversation = participants[phone]
+
+    response_text, intent = await orchestrator.ahandle_inbound(
+        conversation,
+        body=_message_body(message),
+        language=_get_language(message),
+    )
+
+    handler = _INTENT_HANDLERS.get(intent)
+    if handler is not None and response_text:
+        await handler(message, patient, conversation)
+
+
+async def whatsapp_webhook(request: HttpRequest) -> HttpResponse:
+    """Ingest a WhatsApp webhook batch, handling its messages concurrently.
+
+    Django 4.2's ``require_POST``/``csrf_exempt`` wrappers are sync-only, so the
+    method check is inlined and the CSRF exemption is set as an attribute below.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    payload = orjson.loads(request.body) if request.body else {}
+    clinic_slug = payload.get("clinic")
+    if not clinic_slug:
+        return OrjsonResponse({"ok": False, "error": "clinic missing"}, status=400)
+
+    clinic = await sync_to_async(_load_clinic, thread_sensitive=True)(clinic_slug)
+    if clinic is None:
+        return OrjsonResponse({"ok": False, "error": "clinic not found"}, status=404)
+
+    await sync_to_async(_record_webhook_event, thread_sensitive=True)(clinic, payload)
+
+    # status-only entries (delivery receipts, read acks) carry no body
+    messages = [message for message in payload.get("messages", []) if _message_body(message)]
+    participants = await sync_to_async(_resolve_participants, thread_sensitive=True)(
+        clinic, messages
+    )
+    # one failing message must not fail the batch: a 500 makes the provider redeliver
+    # every message, including the ones already handled
+    results = await asyncio.gather(
+        *(_process_message(message, participants) for message in messages),
+        return_exceptions=True,
+    )
+    for message, result in zip(messages, results):
+        if isinstance(result, BaseException):
+            logger.error(
+                "whatsapp.message_failed",
+                exc_info=result,
+                extra={"clinic_id": clinic.id, "message_id": message.get("id")},
             )
 
     return minimal_ok()
 
 
+whatsapp_webhook.csrf_exempt = True
+
+
 @csrf_exempt
 @require_POST
-def whatsapp_delivery_receipt(request: HttpRequest) -> JsonResponse:
-    payload = json.loads(request.body.decode("utf-8") or "{}")
+def whatsapp_delivery_receipt(request: HttpRequest) -> HttpResponse:
+    payload = orjson.loads(request.body) if request.body else {}
     provider_message_id = payload.get("provider_message_id")
     idempotency_key = payload.get("idempotency_key")
     status = (payload.get("status") or "").lower()
@@ -115,11 +247,9 @@ def whatsapp_delivery_receipt(request: HttpRequest) -> JsonResponse:
     if idempotency_key:
         outbox = OutboxMessage.objects.filter(idempotency_key=idempotency_key).first()
     if not outbox and provider_message_id:
-        outbox = OutboxMessage.objects.filter(
-            payload__provider_message_id=provider_message_id
-        ).first()
+        outbox = OutboxMessage.objects.filter(provider_message_id=provider_message_id).first()
     if not outbox:
-        return JsonResponse({"ok": False, "error": "message not found"}, status=404)
+        return OrjsonResponse({"ok": False, "error": "message not found"}, status=404)
 
     if status == "delivered":
         mark_outbox_delivered(outbox, payload.get("delivered_at"))
@@ -38,15 +38,21 @@ def exception_handler(exc, context):
     return response
 
 
+_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
 class WriteRateThrottle(SimpleRateThrottle):
     """Limit write requests per client IP."""
 
     scope = "write"
 
     def get_cache_key(self, request, view):
-        if request.method in ("GET", "HEAD", "OPTIONS"):
+        if request.method in _SAFE_METHODS:
             return None
-        ident = self.get_ident(request)
+        # resolve the client identifier once per request, however many throttles run
+        ident = getattr(request, "_throttle_ident", None)
+        if ident is None:
+            ident = request._throttle_ident = self.get_ident(request)
         if ident is None:
             return None
         return self.cache_format % {"scope": self.scope, "ident": ident}
@@ -0,0 +1,87 @@
+"""Database helpers shared across apps (PostgreSQL-specific)."""
+
+from __future__ import annotations
+
+import hashlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Sequence, Tuple, Type, TypeVar
+
+from django.db import connection, models
+
+ModelT = TypeVar("ModelT", bound=models.Model)
+
+
+def insert_or_get(
+    model: Type[ModelT],
+    conflict_fields: Sequence[str],
+    values: Dict[str, Any],
+) -> Tuple[ModelT, bool]:
+    """``get_or_create`` in one statement: INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    ``values`` holds every field for a new row, including the ``conflict_fields``
+    (which must match a unique constraint). An existing row is returned untouched,
+    like ``get_or_create`` ignoring ``defaults``. Returns ``(instance, created)``.
+    """
+
+    opts = model._meta
+    instance = model(**values)
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    insert_fields = [field for field in opts.concrete_fields if not field.primary_key]
+    conflict = [opts.get_field(name) for name in conflict_fields]
+    columns = ", ".join(quote(field.column) for field in opts.concrete_fields)
+
+    insert_params = [
+        field.get_db_prep_save(field.pre_save(instance, True), connection)
+        for field in insert_fields
+    ]
+    conflict_params = [
+        field.get_db_prep_save(getattr(instance, field.attname), connection)
+        for field in conflict
+    ]
+    # the outer SELECT runs on the statement's snapshot, so it never sees the CTE's
+    # own insert: exactly one branch yields a row
+    sql = (
+        f"WITH inserted AS ("
+        f"INSERT INTO {table} ({', '.join(quote(field.column) for field in insert_fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(insert_fields))}) "
+        f"ON CONFLICT ({', '.join(quote(field.column) for field in conflict)}) DO NOTHING "
+        f"RETURNING {columns}) "
+        f"SELECT {columns}, true AS was_created FROM inserted "
+        f"UNION ALL "
+        f"SELECT {columns}, false FROM {table} "
+        f"WHERE {' AND '.join(f'{quote(field.column)} = %s' for field in conflict)} "
+        f"LIMIT 1"
+    )
+    rows = list(model.objects.raw(sql, [*insert_params, *conflict_params]))
+    if rows:
+        row = rows[0]
+        return row, bool(row.was_created)
+    # a concurrent insert committed after this statement's snapshot was taken
+    lookup = {field.attname: getattr(instance, field.attname) for field in conflict}
+    return model.objects.get(**lookup), False
+
+
+def advisory_lock_key(name: str) -> int:
+    """Stable signed 64-bit key for ``name`` (``hash()`` is salted per process)."""
+    digest = hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@contextmanager
+def try_advisory_lock(name: str) -> Iterator[bool]:
+    """Hold a session-level ``pg_try_advisory_lock`` for the block, without waiting.
+
+    Yields whether the lock was acquired; only the holder releases it on exit.
+    """
+
+    key = advisory_lock_key(name)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
@@ -2,15 +2,28 @@
 
 from __future__ import annotations
 
-import json
-
 from datetime import datetime
 
+import orjson
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.fields.ranges import DateTimeRangeField
 from django.utils import timezone
 from pgvector.django import VectorField
 
+_FROMISO = datetime.fromisoformat
+
+
+def _range_bound_json(value) -> str:
+    # isoformat() output never needs JSON escaping, so the literal is built directly
+    return f'"{value.isoformat()}"' if value else "null"
+
+
+def _parse_range_bound(value):
+    if not value:
+        return None
+    parsed = _FROMISO(value)
+    return timezone.make_aware(parsed) if parsed.tzinfo is None else parsed
+
 
 class CompatArrayField(ArrayField):
     """ArrayField that degrades to JSON/text storage when Postgres is unavailable."""
@@ -40,9 +53,9 @@ class CompatArrayField(ArrayField):
         if connection.vendor == "postgresql":
             return super().get_db_prep_save(value, connection)
         if value is None:
-            return json.dumps([])
+            return "[]"
         value = self.get_prep_value(value)
-        return json.dumps(value)
+        return orjson.dumps(value).decode("utf-8")
 
     def get_placeholder(self, value, compiler, connection):
         if connection.vendor != "postgresql":
@@ -57,8 +70,8 @@ class CompatArrayField(ArrayField):
         if isinstance(value, list):
             return value
         try:
-            return json.loads(value)
-        except json.JSONDecodeError:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
             return value
 
 
@@ -98,39 +111,32 @@ class CompatDateTimeRangeField(DateTimeRangeField):
     #     return json.dumps(payload)
 
     # بعد:
-    def get_db_prep_value(self, value, connection):
+    def get_db_prep_value(self, value, connection, prepared=False):
         if connection.vendor == "postgresql":
-            return super().get_db_prep_value(value, connection)
+            return super().get_db_prep_value(value, connection, prepared)
         if value is None:
             return None
-        value = super().get_prep_value(value)
+        if not prepared:
+            value = super().get_prep_value(value)
         lower = getattr(value, "lower", None)
         upper = getattr(value, "upper", None)
         if lower is None and upper is None and isinstance(value, (tuple, list)):
             lower, upper = value
-        payload = {
-            "lower": lower.isoformat() if lower else None,
-            "upper": upper.isoformat() if upper else None,
-        }
-        return json.dumps(payload)
+        return f'{{"lower": {_range_bound_json(lower)}, "upper": {_range_bound_json(upper)}}}'
 
     def from_db_value(self, value, expression, connection):
         if connection.vendor == "postgresql":
-            return super().from_db_value(value, expression, connection)
+            return value
         if value in (None, ""):
             return None
         if isinstance(value, str):
             try:
-                payload = json.loads(value)
-            except json.JSONDecodeError:
+                payload = orjson.loads(value)
+            except orjson.JSONDecodeError:
                 return value
-            lower = payload.get("lower")
-            upper = payload.get("upper")
-            lower_dt = datetime.fromisoformat(lower) if lower else None
-            upper_dt = datetime.fromisoformat(upper) if upper else None
             return (
-                timezone.make_aware(lower_dt) if lower_dt and lower_dt.tzinfo is None else lower_dt,
-                timezone.make_aware(upper_dt) if upper_dt and upper_dt.tzinfo is None else upper_dt,
+                _parse_range_bound(payload.get("lower")),
+                _parse_range_bound(payload.get("upper")),
             )
         return value
 
@@ -1,7 +1,9 @@
 """Management command to load initial clinic, template, and KB seed data."""
 
 import json
-from datetime import datetime
+import re
+from datetime import time
+from functools import partial
 from pathlib import Path
 from typing import Any, Dict, Iterable, List
 
@@ -9,13 +11,27 @@ import yaml
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.utils import timezone
 
 from apps.clinics.models import Clinic, ClinicService, LanguageChoices, ServiceHours
 from apps.accounts.models import AuditLog, ClinicMembership, StaffAccount
 from apps.kb.models import KnowledgeChunk, KnowledgeDocument, KnowledgeIndex
+from apps.kb.services import bump_kb_version
 from apps.channels.models import HSMTemplate, HSMTemplateStatus
 from apps.templates.models import MessageTemplate, TemplateCategory
 
+SEED_BATCH_SIZE = 500
+# blank-line paragraph breaks, tolerating CRLF and whitespace-only separator lines
+_PARAGRAPH_RE = re.compile(r"\r?\n[ \t\r]*\n")
+# libyaml-backed loader when PyYAML was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _parse_hm(value: str) -> time:
+    """Parse ``H:MM``/``HH:MM`` without strptime's format machinery."""
+    hour, minute = value.split(":", 1)
+    return time(int(hour), int(minute))
+
 
 class Command(BaseCommand):
     help = "Import clinic, template, and knowledge base seeds into the database."
@@ -78,46 +94,74 @@ class Command(BaseCommand):
         documents: List[Dict[str, Any]] = []
         for file_path in files:
             with file_path.open("r", encoding="utf-8") as fh:
-                payload = yaml.safe_load(fh) or {}
+                payload = yaml.load(fh, Loader=YAML_LOADER) or {}
                 documents.extend(payload.get("documents", []))
         return documents
 
     def _seed_clinics(self, clinic_payloads: List[Dict[str, Any]]) -> Dict[str, Clinic]:
-        clinics: Dict[str, Clinic] = {}
-        for payload in clinic_payloads:
-            clinic, _ = Clinic.objects.update_or_create(
-                slug=payload["slug"],
-                defaults={
-                    "name": payload["name"],
-                    "tz": payload.get("tz") or payload.get("timezone", "UTC"),
-                    "default_lang": payload.get("default_lang", "en"),
-                    "phone_number": payload.get("phone_number", ""),
-                    "whatsapp_number": payload.get("whatsapp_number", ""),
-                    "address": payload.get("address", ""),
-                },
-            )
-            clinics[clinic.slug] = clinic
-            self._seed_services(clinic, payload.get("services", []))
-            self._seed_service_hours(clinic, payload.get("service_hours", []))
+        payloads = {payload["slug"]: payload for payload in clinic_payloads}
+        Clinic.objects.bulk_create(
+            [
+                Clinic(
+                    slug=slug,
+                    name=payload["name"],
+                    tz=payload.get("tz") or payload.get("timezone", "UTC"),
+                    default_lang=payload.get("default_lang", "en"),
+                    phone_number=payload.get("phone_number", ""),
+                    whatsapp_number=payload.get("whatsapp_number", ""),
+                    address=payload.get("address", ""),
+                )
+                for slug, payload in payloads.items()
+            ],
+            batch_size=SEED_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["slug"],
+            update_fields=[
+                "name",
+                "tz",
+                "default_lang",
+                "phone_number",
+                "whatsapp_number",
+                "address",
+                "updated_at",
+            ],
+        )
+        # upserts do not return primary keys on Django 4.2, so read the rows back in one query
+        clinics: Dict[str, Clinic] = Clinic.objects.in_bulk(list(payloads), field_name="slug")
+        for slug, payload in payloads.items():
+            self._seed_services(clinics[slug], payload.get("services", []))
+            self._seed_service_hours(clinics[slug], payload.get("service_hours", []))
         return clinics
 
     def _seed_services(self, clinic: Clinic, services: List[Dict[str, Any]]) -> None:
+        rows: Dict[tuple, ClinicService] = {}
         for service in services:
-            ClinicService.objects.update_or_create(
+            language = service.get("language", LanguageChoices.ENGLISH)
+            rows[(service["code"], language)] = ClinicService(
                 clinic=clinic,
                 code=service["code"],
-                language=service.get("language", LanguageChoices.ENGLISH),
-                defaults={
-                    "name": service.get("name", service["code"]),
-                    "description": service.get("description", ""),
-                    "duration_minutes": service.get("duration_minutes", 30),
-                    "is_active": service.get("is_active", True),
-                },
+                language=language,
+                name=service.get("name", service["code"]),
+                description=service.get("description", ""),
+                duration_minutes=service.get("duration_minutes", 30),
+                is_active=service.get("is_active", True),
             )
+        ClinicService.objects.bulk_create(
+            list(rows.values()),
+            batch_size=SEED_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["clinic", "code", "language"],
+            update_fields=["name", "description", "duration_minutes", "is_active", "updated_at"],
+        )
 
     def _seed_service_hours(self, clinic: Clinic, hours_payloads: List[Dict[str, Any]]) -> None:
+        services_by_code: Dict[str, ClinicService] = {}
+        for service in clinic.services.only("id", "code"):
+            services_by_code.setdefault(service.code, service)
+
+        rows: Dict[tuple, ServiceHours] = {}
         for hours in hours_payloads:
-            service = clinic.services.filter(code=hours["service_code"]).first()
+            service = services_by_code.get(hours["service_code"])
             if not service:
                 self.stderr.write(
                     self.style.WARNING(
@@ -126,22 +170,31 @@ class Command(BaseCommand):
                 )
                 continue
 
-            start_time = datetime.strptime(hours["start"], "%H:%M").time()
-            end_time = datetime.strptime(hours["end"], "%H:%M").time()
-
-            ServiceHours.objects.update_or_create(
+            start_time = _parse_hm(hours["start"])
+            end_time = _parse_hm(hours["end"])
+            rows[(service.id, hours["weekday"], start_time)] = ServiceHours(
                 clinic=clinic,
                 service=service,
                 weekday=hours["weekday"],
                 start_time=start_time,
-                defaults={"end_time": end_time},
+                end_time=end_time,
             )
 
+        ServiceHours.objects.bulk_create(
+            list(rows.values()),
+            batch_size=SEED_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["service", "weekday", "start_time"],
+            update_fields=["clinic", "end_time", "updated_at"],
+        )
+
     def _seed_templates(
         self,
         templates: List[Dict[str, Any]],
         clinics: Dict[str, Clinic],
     ) -> None:
+        message_templates: Dict[tuple, MessageTemplate] = {}
+        hsm_templates: Dict[tuple, HSMTemplate] = {}
         for payload in templates:
             clinic_slug = payload["clinic_slug"]
             clinic = clinics.get(clinic_slug)
@@ -151,81 +204,164 @@ class Command(BaseCommand):
                 )
                 continue
 
-            MessageTemplate.objects.update_or_create(
+            language = payload.get("language", LanguageChoices.ENGLISH)
+            message_templates[(clinic.id, payload["code"], language)] = MessageTemplate(
                 clinic=clinic,
                 code=payload["code"],
-                language=payload.get("language", LanguageChoices.ENGLISH),
-                defaults={
-                    "category": payload.get("category", TemplateCategory.WHATSAPP),
-                    "subject": payload.get("subject", ""),
-                    "body": payload.get("body", ""),
-                    "variables": payload.get("variables", []),
-                    "provider_template_id": payload.get("provider_template_id", ""),
-                    "is_active": payload.get("is_active", True),
-                    "metadata": payload.get("metadata", {}),
-                },
+                language=language,
+                category=payload.get("category", TemplateCategory.WHATSAPP),
+                subject=payload.get("subject", ""),
+                body=payload.get("body", ""),
+                variables=payload.get("variables", []),
+                provider_template_id=payload.get("provider_template_id", ""),
+                is_active=payload.get("is_active", True),
+                metadata=payload.get("metadata", {}),
             )
-
-            HSMTemplate.objects.update_or_create(
+            hsm_name = payload.get("hsm_name", payload["code"])
+            hsm_templates[(clinic.id, hsm_name, language)] = HSMTemplate(
                 clinic=clinic,
-                name=payload.get("hsm_name", payload["code"]),
-                language=payload.get("language", LanguageChoices.ENGLISH),
-                defaults={
-                    "body": payload.get("body", ""),
-                    "variables": payload.get("variables", []),
-                    "status": payload.get("status", HSMTemplateStatus.APPROVED),
-                    "provider_template_id": payload.get("provider_template_id", ""),
-                },
+                name=hsm_name,
+                language=language,
+                body=payload.get("body", ""),
+                variables=payload.get("variables", []),
+                status=payload.get("status", HSMTemplateStatus.APPROVED),
+                provider_template_id=payload.get("provider_template_id", ""),
             )
 
+        MessageTemplate.objects.bulk_create(
+            list(message_templates.values()),
+            batch_size=SEED_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["clinic", "code", "language"],
+            update_fields=[
+                "category",
+                "subject",
+                "body",
+                "variables",
+                "provider_template_id",
+                "is_active",
+                "metadata",
+                "updated_at",
+            ],
+        )
+        HSMTemplate.objects.bulk_create(
+            list(hsm_templates.values()),
+            batch_size=SEED_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["clinic", "name", "language"],
+            update_fields=["body", "variables", "status", "provider_template_id", "updated_at"],
+        )
+
     def _seed_knowledge_base(
         self,
         documents: List[Dict[str, Any]],
         clinics: Dict[str, Clinic],
     ) -> None:
+        payloads = [
+            payload
+            for payload in documents
+            if payload.get("language", LanguageChoices.ENGLISH)
+            in (LanguageChoices.ENGLISH, LanguageChoices.ARABIC)
+        ]
+        # KnowledgeDocument has no unique key to upsert on, so match existing rows up front
+        existing = {
+            (doc.clinic_id, doc.title, doc.language): doc
+            for doc in KnowledgeDocument.objects.filter(clinic__in=list(clinics.values()))
+        }
+        now = timezone.now()
+        linked_docs: Dict[int, List[KnowledgeDocument]] = {}
+        to_create: List[KnowledgeDocument] = []
+        to_update: Dict[int, KnowledgeDocument] = {}
         for clinic in clinics.values():
-            index, _ = KnowledgeIndex.objects.update_or_create(
-                clinic=clinic,
-                name="default",
-                defaults={"dimensions": 1536, "retriever_config": {"top_k": 4}},
-            )
-
-            linked_docs = []
-            for payload in documents:
+            for payload in payloads:
                 language = payload.get("language", LanguageChoices.ENGLISH)
-                if language not in (LanguageChoices.ENGLISH, LanguageChoices.ARABIC):
-                    continue
+                fields = {
+                    "source": payload.get("source", "seed"),
+                    "body": payload.get("body", ""),
+                    "metadata": payload.get("metadata", {}),
+                }
+                doc = existing.get((clinic.id, payload["title"], language))
+                if doc is None:
+                    doc = KnowledgeDocument(
+                        clinic=clinic, title=payload["title"], language=language, **fields
+                    )
+                    existing[(clinic.id, doc.title, language)] = doc
+                    to_create.append(doc)
+                else:
+                    for field, value in fields.items():
+                        setattr(doc, field, value)
+                    doc.updated_at = now
+                    if doc.pk is not None:
+                        to_update[doc.pk] = doc
+                linked_docs.setdefault(clinic.id, []).append(doc)
+
+        KnowledgeDocument.objects.bulk_create(to_create, batch_size=SEED_BATCH_SIZE)
+        KnowledgeDocument.objects.bulk_update(
+            list(to_update.values()),
+            ["source", "body", "metadata", "updated_at"],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        self._seed_chunks(to_create + list(to_update.values()))
 
-                doc, _ = KnowledgeDocument.objects.update_or_create(
+        KnowledgeIndex.objects.bulk_create(
+            [
+                KnowledgeIndex(
                     clinic=clinic,
-                    title=payload["title"],
-                    language=language,
-                    defaults={
-                        "source": payload.get("source", "seed"),
-                        "body": payload.get("body", ""),
-                        "metadata": payload.get("metadata", {}),
-                    },
+                    name="default",
+                    dimensions=1536,
+                    retriever_config={"top_k": 4},
+                )
+                for clinic in clinics.values()
+            ],
+            batch_size=SEED_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["clinic", "name"],
+            update_fields=["dimensions", "retriever_config", "updated_at"],
+        )
+        indices: List[KnowledgeIndex] = [
+            index
+            for index in KnowledgeIndex.objects.filter(
+                clinic__in=list(clinics.values()), name="default"
+            )
+            if linked_docs.get(index.clinic_id)
+        ]
+
+        # one delete + one insert for every index's document links instead of set() per index
+        through = KnowledgeIndex.documents.through
+        through.objects.filter(knowledgeindex__in=indices).delete()
+        through.objects.bulk_create(
+            [
+                through(knowledgeindex_id=index.id, knowledgedocument_id=doc.id)
+                for index in indices
+                for doc in {doc.id: doc for doc in linked_docs[index.clinic_id]}.values()
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+        # after commit: a bump inside the seed transaction would let other processes
+        # cache the pre-seed answers under the new version
+        for clinic in clinics.values():
+            transaction.on_commit(partial(bump_kb_version, clinic.id))
+
+    def _seed_chunks(self, documents: List[KnowledgeDocument]) -> None:
+        KnowledgeChunk.objects.filter(document__in=documents).delete()
+        chunks: List[KnowledgeChunk] = []
+        for document in documents:
+            paragraphs = [para.strip() for para in _PARAGRAPH_RE.split(document.body) if para.strip()]
+            if not paragraphs:
+                paragraphs = [document.body]
+            tags = document.metadata.get("tags", [])
+            chunks.extend(
+                KnowledgeChunk(
+                    document=document,
+                    chunk_index=idx,
+                    content=content,
+                    metadata={"seed": True},
+                    language=document.language,
+                    tags=tags,
                 )
-                self._seed_chunks(doc)
-                linked_docs.append(doc)
-
-            if linked_docs:
-                index.documents.set(linked_docs)
-
-    def _seed_chunks(self, document: KnowledgeDocument) -> None:
-        KnowledgeChunk.objects.filter(document=document).delete()
-        paragraphs = [para.strip() for para in document.body.split("\n\n") if para.strip()]
-        if not paragraphs:
-            paragraphs = [document.body]
-        for idx, content in enumerate(paragraphs):
-            KnowledgeChunk.objects.create(
-                document=document,
-                chunk_index=idx,
-                content=content,
-                metadata={"seed": True},
-                language=document.language,
-                tags=document.metadata.get("tags", []),
+                for idx, content in enumerate(paragraphs)
             )
+        KnowledgeChunk.objects.bulk_create(chunks, batch_size=SEED_BATCH_SIZE)
 
     def _seed_auth(self, clinics: Dict[str, Clinic]) -> None:
         clinic = clinics.get("demo-dental")
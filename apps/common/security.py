@@ -4,13 +4,17 @@ from __future__ import annotations
 
 import base64
 import hashlib
+from functools import lru_cache
 from typing import Optional
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from cryptography.fernet import Fernet, InvalidToken
 
 _ENCRYPTION_PREFIX = "enc::"
+_PREFIX_BYTES = _ENCRYPTION_PREFIX.encode("ascii")
 
 
 def _derive_key(source: str) -> bytes:
@@ -18,16 +22,27 @@ def _derive_key(source: str) -> bytes:
     return base64.urlsafe_b64encode(digest)
 
 
-def _get_fernet() -> Fernet:
-    secret = settings.ENCRYPTION_KEY
+@lru_cache(maxsize=4)
+def _get_fernet(secret: str) -> Fernet:
     if not secret:
         raise ImproperlyConfigured("ENCRYPTION_KEY is required for secret storage")
     key = _derive_key(secret)
     return Fernet(key)
 
 
-def is_encrypted_secret(value: Optional[str]) -> bool:
-    return bool(value and value.startswith(_ENCRYPTION_PREFIX))
+@receiver(setting_changed)
+def _reset_fernet(*, setting: str, **kwargs) -> None:
+    # entries are keyed on the secret, so a rotated key never reads a stale one;
+    # clearing just drops the old key material instead of keeping it cached
+    if setting == "ENCRYPTION_KEY":
+        _get_fernet.cache_clear()
+
+
+def is_encrypted_secret(value: Optional[str | bytes]) -> bool:
+    if not value:
+        return False
+    prefix = _PREFIX_BYTES if isinstance(value, bytes) else _ENCRYPTION_PREFIX
+    return value.startswith(prefix)
 
 
 def encrypt_secret(value: str) -> str:
@@ -35,9 +50,8 @@ def encrypt_secret(value: str) -> str:
         return value
     if is_encrypted_secret(value):
         return value
-    fernet = _get_fernet()
-    token = fernet.encrypt(value.encode("utf-8")).decode("utf-8")
-    return f"{_ENCRYPTION_PREFIX}{token}"
+    token = _get_fernet(settings.ENCRYPTION_KEY).encrypt(value.encode("utf-8"))
+    return (_PREFIX_BYTES + token).decode("ascii")
 
 
 def decrypt_secret(value: Optional[str]) -> str:
@@ -45,9 +59,9 @@ def decrypt_secret(value: Optional[str]) -> str:
         return ""
     if not is_encrypted_secret(value):
         return value
-    token = value[len(_ENCRYPTION_PREFIX):]
-    fernet = _get_fernet()
+    fernet = _get_fernet(settings.ENCRYPTION_KEY)
     try:
-        return fernet.decrypt(token.encode("utf-8")).decode("utf-8")
+        # Fernet accepts str tokens directly, so no intermediate encode is needed
+        return fernet.decrypt(value.removeprefix(_ENCRYPTION_PREFIX)).decode("utf-8")
     except InvalidToken as exc:
         raise ImproperlyConfigured("Failed to decrypt secret") from exc
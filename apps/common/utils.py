@@ -5,7 +5,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict
 
-from django.http import JsonResponse
+import orjson
+from django.http import HttpResponse
 from django.utils import timezone
 
 
@@ -14,11 +15,19 @@ def now_utc():
     return timezone.now()
 
 
-def minimal_ok(**extra: Any) -> JsonResponse:
+class OrjsonResponse(HttpResponse):
+    """Compact JSON response serialised with orjson; unknown types fall back to ``str``."""
+
+    def __init__(self, data: Any, **kwargs: Any) -> None:
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(orjson.dumps(data, default=str), **kwargs)
+
+
+def minimal_ok(**extra: Any) -> OrjsonResponse:
     """Return the default JSON envelope enforced by the API spec."""
     payload: Dict[str, Any] = {"ok": True}
     payload.update(extra)
-    return JsonResponse(payload)
+    return OrjsonResponse(payload)
 
 
 @dataclass(slots=True)
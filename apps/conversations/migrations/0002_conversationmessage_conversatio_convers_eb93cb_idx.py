@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversationmessage',
+            index=models.Index(fields=['conversation', 'direction', '-created_at'], name='conversatio_convers_eb93cb_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-16 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conversations', '0002_conversationmessage_conversatio_convers_eb93cb_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['clinic', '-updated_at'], name='conversatio_clinic__63a4a8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['clinic', 'handoff_required'], name='conversatio_clinic__db889e_idx'),
+        ),
+        migrations.AlterField(
+            model_name='conversationmessage',
+            name='direction',
+            field=models.CharField(choices=[('inbound', 'Inbound'), ('outbound', 'Outbound')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmessage',
+            index=models.Index(fields=['created_at'], name='conversatio_created_fcac3c_idx'),
+        ),
+    ]
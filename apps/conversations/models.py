@@ -36,10 +36,19 @@ class Conversation(TimeStampedModel):
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(fields=["clinic", "-updated_at"]),
+            models.Index(fields=["clinic", "handoff_required"]),
+        ]
 
     def __str__(self) -> str:
         return f"Conversation<{self.pk}> {self.fsm_state}"
 
+    @staticmethod
+    def build_dedupe_key(clinic: Clinic, phone: str) -> str:
+        """Canonical per-clinic key for a patient's WhatsApp thread."""
+        return f"{clinic.slug}:{phone}"
+
 
 class ConversationMessage(TimeStampedModel):
     """Individual inbound/outbound WhatsApp messages."""
@@ -47,9 +56,7 @@ class ConversationMessage(TimeStampedModel):
     conversation = models.ForeignKey(
         Conversation, on_delete=models.CASCADE, related_name="messages"
     )
-    direction = models.CharField(
-        max_length=10, choices=MessageDirection.choices, db_index=True
-    )
+    direction = models.CharField(max_length=10, choices=MessageDirection.choices)
     language = models.CharField(
         max_length=2, choices=LanguageChoices.choices, default=LanguageChoices.ENGLISH
     )
@@ -61,6 +68,27 @@ class ConversationMessage(TimeStampedModel):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # session-window checks: latest inbound/outbound per conversation
+            models.Index(fields=["conversation", "direction", "-created_at"]),
+            # metrics windows and the retention sweep range-scan created_at
+            models.Index(fields=["created_at"]),
+        ]
+
+
+class SessionStateQuerySet(models.QuerySet):
+    """Custom queryset helpers for session state."""
+
+    def for_conversation(self, conversation: Conversation) -> "SessionState":
+        """Return the conversation's state, reusing the instance cache and creating it only when missing."""
+        try:
+            return conversation.session_state
+        except SessionState.DoesNotExist:
+            pass
+        # first message of a thread only; get_or_create covers a concurrent insert
+        state, _ = self.get_or_create(conversation=conversation)
+        conversation.session_state = state
+        return state
 
 
 class SessionState(TimeStampedModel):
@@ -74,5 +102,7 @@ class SessionState(TimeStampedModel):
     context = models.JSONField(default=dict, blank=True)
     llm_guardrails = models.JSONField(default=dict, blank=True)
 
+    objects = SessionStateQuerySet.as_manager()
+
     def __str__(self) -> str:
         return f"State<{self.conversation_id}>"
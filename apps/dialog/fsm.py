@@ -3,7 +3,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Callable, Dict, Optional
+from typing import Callable, Dict, Tuple
+
+from django.utils import timezone
 
 from apps.conversations.models import Conversation
 from apps.dialog.topic_corridor import TopicCorridor, TopicCorridorDecision
@@ -25,21 +27,31 @@ TransitionGuard = Callable[[Conversation, dict], bool]
 TransitionAction = Callable[[Conversation, dict], None]
 
 
-@dataclass(frozen=True)
+def _always_allow(conversation: Conversation, context: dict) -> bool:
+    return True
+
+
+def _no_action(conversation: Conversation, context: dict) -> None:
+    return None
+
+
+@dataclass(frozen=True, slots=True)
 class Transition:
     source: str
     trigger: str
     destination: str
-    guard: Optional[TransitionGuard] = None
-    action: Optional[TransitionAction] = None
+    guard: TransitionGuard = _always_allow
+    action: TransitionAction = _no_action
 
 
 class DialogFSM:
     """Simple FSM with pluggable transition guards."""
 
-    def __init__(self, corridor: TopicCorridor | None = None) -> None:
+    def __init__(self, corridor: TopicCorridor | None = None, use_bulk_update: bool = True) -> None:
         self.corridor = corridor or TopicCorridor()
-        self.transitions: Dict[str, list[Transition]] = {}
+        # no post_save observers exist for Conversation; set False if one is added
+        self.use_bulk_update = use_bulk_update
+        self.transitions: Dict[Tuple[str, str], Transition] = {}
         self._register_default_transitions()
 
     def _register_default_transitions(self) -> None:
@@ -54,12 +66,12 @@ class DialogFSM:
         add(DialogState.CANCEL, "restart", DialogState.QUALIFICATION)
 
     def _register(self, source: str, trigger: str, destination: str) -> None:
-        self.transitions.setdefault(source, []).append(
-            Transition(source=source, trigger=trigger, destination=destination)
+        self.transitions[(source, trigger)] = Transition(
+            source=source, trigger=trigger, destination=destination
         )
 
     def can_transition(self, conversation: Conversation, trigger: str) -> bool:
-        return any(t.trigger == trigger for t in self.transitions.get(conversation.fsm_state, []))
+        return (conversation.fsm_state, trigger) in self.transitions
 
     def apply(
         self,
@@ -70,18 +82,26 @@ class DialogFSM:
         context = context or {}
         topic_decision: TopicCorridorDecision = self.corridor.evaluate(conversation, context)
         if topic_decision.handoff_required:
-            conversation.handoff_required = True
-            conversation.save(update_fields=["handoff_required", "updated_at"])
+            self._persist(conversation, handoff_required=True)
             return False
 
-        for transition in self.transitions.get(conversation.fsm_state, []):
-            if transition.trigger != trigger:
-                continue
-            if transition.guard and not transition.guard(conversation, context):
-                continue
-            conversation.fsm_state = transition.destination
-            if transition.action:
-                transition.action(conversation, context)
-            conversation.save(update_fields=["fsm_state", "updated_at"])
-            return True
-        return False
+        transition = self.transitions.get((conversation.fsm_state, trigger))
+        if transition is None:
+            return False
+        if not transition.guard(conversation, context):
+            return False
+        conversation.fsm_state = transition.destination
+        transition.action(conversation, context)
+        self._persist(conversation, fsm_state=conversation.fsm_state)
+        return True
+
+    def _persist(self, conversation: Conversation, **fields) -> None:
+        for field, value in fields.items():
+            setattr(conversation, field, value)
+        if not self.use_bulk_update:
+            conversation.save(update_fields=[*fields, "updated_at"])
+            return
+        conversation.updated_at = timezone.now()
+        Conversation.objects.filter(pk=conversation.pk).update(
+            updated_at=conversation.updated_at, **fields
+        )
@@ -2,16 +2,32 @@
 
 from __future__ import annotations
 
+import re
+
+_KEYWORDS = {
+    "book": ("book", "appointment", "schedule", "slot"),
+    "confirm": ("confirm", "yes", "done"),
+    "cancel": ("cancel", "drop", "no"),
+    "reschedule": ("reschedule", "change", "move"),
+}
+
+_INTENT_MAP = {keyword: intent for intent, vocab in _KEYWORDS.items() for keyword in vocab}
+
+# Keywords are anchored at word starts so inflections ("booking", "cancelled") still hit;
+# short ones must be whole words so "now"/"know" never read as "no".
+_PATTERN = re.compile(
+    r"\b("
+    + "|".join(
+        re.escape(keyword) + (r"\b" if len(keyword) < 4 else "")
+        for keyword in sorted(_INTENT_MAP, key=len, reverse=True)
+    )
+    + r")"
+)
+
 
 def detect_intent(text: str) -> str:
     """Return basic intents using keywords."""
-    keywords = {
-        "book": {"book", "appointment", "schedule", "slot"},
-        "confirm": {"confirm", "yes", "done"},
-        "cancel": {"cancel", "drop", "no"},
-        "reschedule": {"reschedule", "change", "move"},
-    }
-    for intent, vocab in keywords.items():
-        if any(token in text for token in vocab):
-            return intent
-    return "clarify"
+    match = _PATTERN.search(text.casefold())
+    if match is None:
+        return "clarify"
+    return _INTENT_MAP[match.group(1)]
@@ -3,8 +3,11 @@
 from __future__ import annotations
 
 import re
+import sys
+from functools import lru_cache
 
-ARABIC_DIACRITICS = re.compile(r"[ؗ-ًؚ-ْ]")
+# Quranic marks U+0617-U+061A and harakat/tanwin/shadda/sukun U+064B-U+0652
+ARABIC_DIACRITICS = frozenset(map(chr, [*range(0x0617, 0x061B), *range(0x064B, 0x0653)]))
 EASTERN_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")  # Arabic-Indic digits to Western digits
 
 ARABIC_CHAR_VARIANTS = {
@@ -17,6 +20,11 @@ ARABIC_CHAR_VARIANTS = {
     "ئ": "ي",  # Ya with hamza -> Ya
 }
 
+# digits and letter variants are 1:1 and diacritics are dropped, so one translate() covers all three
+ARABIC_CHAR_TRANS = str.maketrans(
+    {**EASTERN_DIGITS, **ARABIC_CHAR_VARIANTS, **dict.fromkeys(ARABIC_DIACRITICS)}
+)
+
 PHRASE_REPLACEMENTS = {
     "بعد بكرة": "بعد غد",
     "بعد غدا": "بعد غد",
@@ -24,6 +32,10 @@ PHRASE_REPLACEMENTS = {
     "tomorrow": "غد",
     "today": "اليوم",
 }
+# longest phrase first so "after tomorrow" wins over "tomorrow" in the single scan
+PHRASE_RE = re.compile(
+    "|".join(map(re.escape, sorted(PHRASE_REPLACEMENTS, key=len, reverse=True)))
+)
 
 TOKEN_REPLACEMENTS = {
     "بكرة": "غد",
@@ -37,48 +49,53 @@ TOKEN_REPLACEMENTS = {
     "cost": "سعر",
     "cleaning": "تنظيف",
 }
-
-PRICE_KEYWORDS = {"سعر", "price", "cost"}
-SERVICE_KEYWORDS = {"تنظيف", "استشارة", "تنظيفات"}
-
-
-def _apply_char_variants(text: str) -> str:
-    for original, replacement in ARABIC_CHAR_VARIANTS.items():
-        text = text.replace(original, replacement)
-    return text
-
-
-def _apply_phrase_replacements(text: str) -> str:
-    lowered = text
-    for phrase, replacement in PHRASE_REPLACEMENTS.items():
-        lowered = lowered.replace(phrase, replacement)
-    return lowered
-
-
-def _replace_tokens(tokens: list[str]) -> list[str]:
-    return [TOKEN_REPLACEMENTS.get(token, token) for token in tokens]
-
-
-def _append_intent_tokens(tokens: list[str]) -> list[str]:
-    if any(token in PRICE_KEYWORDS for token in tokens):
-        tokens.append("intent_price")
-    if any(token in SERVICE_KEYWORDS for token in tokens):
-        tokens.append("intent_service")
-    return tokens
-
-
-def normalize_text(value: str) -> str:
+# Arabic literals are not auto-interned; interning makes remapped tokens the same objects
+# as the keyword set members, so membership checks resolve on identity
+TOKEN_REPLACEMENTS = {token: sys.intern(value) for token, value in TOKEN_REPLACEMENTS.items()}
+
+PRICE_KEYWORDS = frozenset(map(sys.intern, {"سعر", "price", "cost"}))
+SERVICE_KEYWORDS = frozenset(map(sys.intern, {"تنظيف", "استشارة", "تنظيفات"}))
+INTENT_PRICE_TOKEN = sys.intern("intent_price")
+INTENT_SERVICE_TOKEN = sys.intern("intent_service")
+
+
+def _phrase_replacement(match: re.Match) -> str:
+    return PHRASE_REPLACEMENTS[match.group(0)]
+
+
+# inbound bodies repeat heavily ("yes", "نعم", "بكرة"); bounded so odd traffic cannot grow it
+@lru_cache(maxsize=4096)
+def normalize_text(
+    value: str,
+    *,
+    # bound at definition time so the per-token loop reads locals, not module globals
+    _char_trans: dict[int, str | None] = ARABIC_CHAR_TRANS,
+    _phrase_sub=PHRASE_RE.sub,
+    _token_get=TOKEN_REPLACEMENTS.get,
+    _price: frozenset[str] = PRICE_KEYWORDS,
+    _service: frozenset[str] = SERVICE_KEYWORDS,
+) -> str:
     """Normalize bilingual text: digits, diacritics, synonyms, and intent hints."""
     if not value:
         return ""
 
     text = value.strip().lower()
-    text = text.translate(EASTERN_DIGITS)
-    text = ARABIC_DIACRITICS.sub("", text)
-    text = _apply_char_variants(text)
-    text = _apply_phrase_replacements(text)
-
-    tokens = text.split()
-    tokens = _replace_tokens(tokens)
-    tokens = _append_intent_tokens(tokens)
+    if not text.isascii():  # O(1) flag check; ASCII bodies have nothing to translate
+        text = text.translate(_char_trans)
+    text = _phrase_sub(_phrase_replacement, text)
+
+    # remap tokens and spot intent keywords in the same pass
+    tokens: list[str] = []
+    saw_price = saw_service = False
+    for token in text.split():
+        token = _token_get(token, token)
+        if token in _price:
+            saw_price = True
+        if token in _service:
+            saw_service = True
+        tokens.append(token)
+    if saw_price:
+        tokens.append(INTENT_PRICE_TOKEN)
+    if saw_service:
+        tokens.append(INTENT_SERVICE_TOKEN)
     return " ".join(tokens)
@@ -3,8 +3,10 @@
 from __future__ import annotations
 
 import logging
+from functools import lru_cache
 from typing import Tuple
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
 from zoneinfo import ZoneInfo
@@ -29,10 +31,31 @@ AR_TENTATIVE_NOTE = " (موعد مؤقت)"
 AR_SINGLE_SLOT_PROMPT = "أقترح {slot}. هل يناسبك؟"
 AR_DOUBLE_SLOT_PROMPT = "أستطيع حجز {slot1} أو {slot2}. أيهما أفضل لك؟"
 
+SLOT_LABEL_FORMAT = "%A %d %b %I:%M %p"
+# (tentative note, one-slot prompt, two-slot prompt) per reply language; English otherwise
+_EN_SLOT_PROMPTS = (
+    " (tentative hold)",
+    "I can offer {slot}. Does that work?",
+    "I can offer {slot1} or {slot2}. Which works best for you?",
+)
+_SLOT_PROMPTS = {"ar": (AR_TENTATIVE_NOTE, AR_SINGLE_SLOT_PROMPT, AR_DOUBLE_SLOT_PROMPT)}
+
+
+# intents answered without the LLM router; every other intent goes to DeepSeek
+LOCAL_INTENTS = frozenset({"book", "confirm", "cancel", "reschedule"})
+
+
+@lru_cache(maxsize=64)
+def _clinic_tz(name: str) -> ZoneInfo:
+    """Resolve a clinic timezone once per process; blank names fall back to UTC."""
+    return ZoneInfo(name or "UTC")
+
 
 class DialogOrchestrator:
     """Main entrypoint for inbound WhatsApp message handling."""
 
+    __slots__ = ("fsm", "llm_router")
+
     def __init__(self) -> None:
         self.fsm = DialogFSM()
         self.llm_router = LLMRouter()
@@ -42,20 +65,67 @@ class DialogOrchestrator:
         conversation: Conversation,
         body: str,
         language: str,
+        *,
+        inbound: ConversationMessage | None = None,
+        llm_result: str | Exception | None = None,
     ) -> Tuple[str | None, str]:
+        """Record and answer one inbound message.
+
+        Callers pass ``conversation`` with ``clinic`` and ``patient`` already loaded
+        (``select_related`` or assigned instances); replies read both. ``inbound`` is
+        the row from ``_record_inbound`` and ``llm_result`` the router outcome when the
+        caller already stored or resolved them (see ``ahandle_inbound``).
+        """
+        if inbound is None:
+            inbound = self._record_inbound(conversation, body, language)
+        intent = inbound.intent
+        response_text, queue_session = self._reply(
+            conversation, body, intent, language, llm_result
+        )
+
+        if response_text:
+            ConversationMessage.objects.create(
+                conversation=conversation,
+                direction="outbound",
+                language=language,
+                body=response_text,
+                intent="reply",
+                metadata={"auto_reply": True},
+            )
+        if response_text and queue_session:
+            enqueue_whatsapp_session_message(
+                clinic_id=conversation.clinic_id,
+                conversation=conversation,
+                language=language,
+                message_body=response_text,
+            )
+        return response_text, intent
+
+    def _record_inbound(
+        self, conversation: Conversation, body: str, language: str
+    ) -> ConversationMessage:
         normalized = normalize_text(body)
-        intent = detect_intent(normalized)
-        ConversationMessage.objects.create(
+        # stored before the reply is computed so created_at marks arrival (TTFR depends on it)
+        return ConversationMessage.objects.create(
             conversation=conversation,
             direction="inbound",
             language=language,
             body=body,
             normalized_body=normalized,
-            intent=intent,
+            intent=detect_intent(normalized),
             metadata={"received_at": timezone.now().isoformat()},
         )
 
-        session_state, _ = SessionState.objects.get_or_create(conversation=conversation)
+    def _reply(
+        self,
+        conversation: Conversation,
+        body: str,
+        intent: str,
+        language: str,
+        llm_result: str | Exception | None = None,
+    ) -> Tuple[str | None, bool]:
+        """Run the intent branch; returns the reply text and whether to queue it as a session message."""
+        session_state = SessionState.objects.for_conversation(conversation)
         response_text: str | None = None
         queue_session = True
 
@@ -74,7 +144,9 @@ class DialogOrchestrator:
                     for slot in slots
                 ]
                 session_state.context["slot_offer_prompt"] = prompt
-                session_state.save(update_fields=["context", "updated_at"])
+                SessionState.objects.filter(pk=session_state.pk).update(
+                    context=session_state.context, updated_at=timezone.now()
+                )
                 response_text = prompt
             else:
                 response_text = AR_NO_AVAILABILITY if language == "ar" else "I'll review the calendar and follow up with options."
@@ -84,12 +156,16 @@ class DialogOrchestrator:
             queue_session = False
         else:
             try:
-                response_text = self.llm_router.answer(
-                    clinic=conversation.clinic,
-                    language=language,
-                    prompt=body,
-                    conversation_id=conversation.id,
-                )
+                if llm_result is None:
+                    llm_result = self.llm_router.answer(
+                        clinic=conversation.clinic,
+                        language=language,
+                        prompt=body,
+                        conversation_id=conversation.id,
+                    )
+                elif isinstance(llm_result, Exception):
+                    raise llm_result
+                response_text = llm_result
             except LLMRouterError as exc:
                 error_code = str(exc)
                 logger.warning("LLM fallback (%s): %s", error_code, exc)
@@ -114,23 +190,34 @@ class DialogOrchestrator:
                     conversation.handoff_required = True
                     conversation.save(update_fields=["handoff_required", "updated_at"])
 
-        if response_text:
-            ConversationMessage.objects.create(
-                conversation=conversation,
-                direction="outbound",
-                language=language,
-                body=response_text,
-                intent="reply",
-                metadata={"auto_reply": True},
-            )
-            if queue_session:
-                enqueue_whatsapp_session_message(
-                    clinic_id=conversation.clinic_id,
-                    conversation=conversation,
+        return response_text, queue_session
+
+    async def ahandle_inbound(
+        self,
+        conversation: Conversation,
+        body: str,
+        language: str,
+    ) -> Tuple[str | None, str]:
+        """Async entrypoint; ORM work stays on Django's shared sync thread."""
+        inbound = await sync_to_async(self._record_inbound, thread_sensitive=True)(
+            conversation, body, language
+        )
+        llm_result: str | Exception | None = None
+        if inbound.intent not in LOCAL_INTENTS:
+            # resolve the LLM reply first so concurrent messages overlap their API calls
+            try:
+                llm_result = await self.llm_router.aanswer(
+                    clinic=conversation.clinic,
                     language=language,
-                    message_body=response_text,
+                    prompt=body,
+                    conversation_id=conversation.id,
                 )
-        return response_text, intent
+            except Exception as exc:
+                # re-raised inside _reply so failures take exactly the sync path
+                llm_result = exc
+        return await sync_to_async(self.handle_inbound, thread_sensitive=True)(
+            conversation, body, language, inbound=inbound, llm_result=llm_result
+        )
 
     def _handle_terminal_intent(self, conversation: Conversation, intent: str, language: str) -> str:
         if intent == "confirm":
@@ -159,20 +246,17 @@ class DialogOrchestrator:
         return ""
 
     def _build_slot_prompt(self, slots: list[SuggestedSlot], language: str, clinic_timezone: str) -> str:
-        tz = ZoneInfo(clinic_timezone or "UTC")
-        formatted: list[str] = []
-        for slot in slots[:2]:
-            local_start = slot.start.astimezone(tz)
-            label = local_start.strftime("%A %d %b %I:%M %p")
-            if slot.tentative:
-                label += AR_TENTATIVE_NOTE if language == "ar" else " (tentative hold)"
-            formatted.append(label)
-        if not formatted:
+        if not slots:
             return "I will follow up with available times."
-        if language == "ar":
-            if len(formatted) == 1:
-                return AR_SINGLE_SLOT_PROMPT.format(slot=formatted[0])
-            return AR_DOUBLE_SLOT_PROMPT.format(slot1=formatted[0], slot2=formatted[1])
-        if len(formatted) == 1:
-            return f"I can offer {formatted[0]}. Does that work?"
-        return f"I can offer {formatted[0]} or {formatted[1]}. Which works best for you?"
+        tz = _clinic_tz(clinic_timezone)
+        tentative_note, single_prompt, double_prompt = _SLOT_PROMPTS.get(language, _EN_SLOT_PROMPTS)
+        # at most two slots are offered, so label them directly instead of looping over a slice
+        first = _slot_label(slots[0], tz, tentative_note)
+        if len(slots) == 1:
+            return single_prompt.format(slot=first)
+        return double_prompt.format(slot1=first, slot2=_slot_label(slots[1], tz, tentative_note))
+
+
+def _slot_label(slot: SuggestedSlot, tz: ZoneInfo, tentative_note: str) -> str:
+    label = slot.start.astimezone(tz).strftime(SLOT_LABEL_FORMAT)
+    return label + tentative_note if slot.tentative else label
@@ -30,7 +30,7 @@ class TopicCorridor:
         if not message:
             return TopicCorridorDecision()
 
-        session_state, _ = SessionState.objects.get_or_create(conversation=conversation)
+        session_state = SessionState.objects.for_conversation(conversation)
         now = timezone.now()
         violation_count = session_state.context.get("violations", 0)
 
@@ -38,7 +38,7 @@ class TopicCorridor:
             violation_count += 1
             session_state.context["violations"] = violation_count
             session_state.last_nudged_at = now
-            session_state.save(update_fields=["context", "last_nudged_at", "updated_at"])
+            _write_state(session_state, now, context=session_state.context, last_nudged_at=now)
 
             if violation_count == 1:
                 return TopicCorridorDecision(allow=False, nudge_required=True)
@@ -49,6 +49,12 @@ class TopicCorridor:
         # decay violations over time
         if session_state.last_nudged_at and now - session_state.last_nudged_at > self.polite_window:
             session_state.context["violations"] = 0
-            session_state.save(update_fields=["context", "updated_at"])
+            _write_state(session_state, now, context=session_state.context)
 
         return TopicCorridorDecision()
+
+
+def _write_state(session_state: SessionState, now, **fields) -> None:
+    """Persist ``fields`` with one UPDATE, skipping save()'s signal and field plumbing."""
+    session_state.updated_at = now
+    SessionState.objects.filter(pk=session_state.pk).update(updated_at=now, **fields)
@@ -1,98 +1,148 @@
 ﻿from __future__ import annotations
 
-from datetime import timedelta
-from statistics import mean
+import asyncio
+from datetime import datetime, timedelta
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Avg,
+    Count,
+    DurationField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    Min,
+    OuterRef,
+    Q,
+)
 from django.http import JsonResponse
 from django.utils import timezone
 
 from apps.channels.models import OutboxMessage, OutboxStatus
-from apps.conversations.models import Conversation, ConversationMessage
-from apps.llm.models import LLMRequestLog
+from apps.conversations.models import Conversation, ConversationMessage, MessageDirection
+from apps.llm.models import LLMRequestLog, RetrievalLog
 
+METRICS_SUMMARY_CACHE_KEY = "metrics-summary"
+METRICS_SUMMARY_CACHE_SECONDS = int(getattr(settings, "METRICS_SUMMARY_CACHE_SECONDS", 30))
+METRICS_SUMMARY_LOCK_KEY = "metrics-summary:lock"
+METRICS_SUMMARY_LOCK_SECONDS = 10
+# how long other requests wait for the recomputing one before computing themselves
+METRICS_SUMMARY_WAIT_SECONDS = 5.0
+METRICS_SUMMARY_POLL_SECONDS = 0.05
 
-def metrics_summary(request):
-    now = timezone.now()
+
+async def metrics_summary(request):
+    # dashboards poll this endpoint; serve the same snapshot for a short window
+    payload = await cache.aget(METRICS_SUMMARY_CACHE_KEY)
+    if payload is None:
+        payload = await _refresh_metrics_summary()
+    return JsonResponse(payload)
+
+
+async def _refresh_metrics_summary() -> dict:
+    # each recomputation runs six aggregates: let one request rebuild the snapshot and
+    # have concurrent misses wait for it rather than pile on
+    if await cache.aadd(METRICS_SUMMARY_LOCK_KEY, True, METRICS_SUMMARY_LOCK_SECONDS):
+        try:
+            payload = await _metrics_summary_payload()
+            await cache.aset(METRICS_SUMMARY_CACHE_KEY, payload, METRICS_SUMMARY_CACHE_SECONDS)
+        finally:
+            await cache.adelete(METRICS_SUMMARY_LOCK_KEY)
+        return payload
+    deadline = timezone.now() + timedelta(seconds=METRICS_SUMMARY_WAIT_SECONDS)
+    while timezone.now() < deadline:
+        await asyncio.sleep(METRICS_SUMMARY_POLL_SECONDS)
+        payload = await cache.aget(METRICS_SUMMARY_CACHE_KEY)
+        if payload is not None:
+            return payload
+    # the lock holder is stuck or gone; the lock expires on its own
+    return await _metrics_summary_payload()
+
+
+async def _metrics_summary_payload() -> dict:
+    # one hop to the shared sync thread: the aggregates reuse that thread's connection
+    # instead of each opening (and closing) one on a pool thread
+    return await sync_to_async(_compute_metrics_summary, thread_sensitive=True)(timezone.now())
+
+
+def _compute_metrics_summary(now: datetime) -> dict:
+    week_cutoff = now - timedelta(days=7)
     metrics = {
         "ttfr_seconds": {
-            "day": _average_ttfr(1),
-            "week": _average_ttfr(7),
+            "day": _average_ttfr(now - timedelta(days=1)),
+            "week": _average_ttfr(week_cutoff),
         },
-        "intent_accuracy": _intent_accuracy(7),
-        "grounded_answer_rate": _grounded_answer_rate(7),
-        "handoff_rate": _handoff_rate(7),
-        "delivery_fail_rate": _delivery_fail_rate(7),
+        "intent_accuracy": _intent_accuracy(week_cutoff),
+        "grounded_answer_rate": _grounded_answer_rate(week_cutoff),
+        "handoff_rate": _handoff_rate(week_cutoff),
+        "delivery_fail_rate": _delivery_fail_rate(week_cutoff),
     }
-    return JsonResponse({"ok": True, "generated_at": now.isoformat(), "metrics": metrics})
+    return {"ok": True, "generated_at": now.isoformat(), "metrics": metrics}
 
 
-def _average_ttfr(days: int) -> float:
-    cutoff = timezone.now() - timedelta(days=days)
-    conversation_ids = (
+def _average_ttfr(cutoff: datetime) -> float:
+    # first inbound/outbound per conversation in one grouped query, averaged by the database
+    firsts = (
         ConversationMessage.objects.filter(created_at__gte=cutoff)
-        .values_list("conversation_id", flat=True)
-        .distinct()
-    )
-    durations = []
-    for conversation_id in conversation_ids:
-        inbound = (
-            ConversationMessage.objects.filter(
-                conversation_id=conversation_id,
-                direction="inbound",
-                created_at__gte=cutoff,
-            )
-            .order_by("created_at")
-            .first()
+        .order_by()
+        .values("conversation_id")
+        .annotate(
+            first_in=Min("created_at", filter=Q(direction=MessageDirection.INBOUND)),
+            first_out=Min("created_at", filter=Q(direction=MessageDirection.OUTBOUND)),
         )
-        outbound = (
-            ConversationMessage.objects.filter(
-                conversation_id=conversation_id,
-                direction="outbound",
-                created_at__gte=cutoff,
-            )
-            .order_by("created_at")
-            .first()
+        .filter(first_out__gt=F("first_in"))
+        .annotate(
+            gap=ExpressionWrapper(F("first_out") - F("first_in"), output_field=DurationField())
         )
-        if inbound and outbound and outbound.created_at > inbound.created_at:
-            durations.append((outbound.created_at - inbound.created_at).total_seconds())
-    return mean(durations) if durations else 0.0
+    )
+    average = firsts.aggregate(average=Avg("gap"))["average"]
+    return average.total_seconds() if average else 0.0
 
 
-def _intent_accuracy(days: int) -> float:
-    cutoff = timezone.now() - timedelta(days=days)
-    inbound = ConversationMessage.objects.filter(direction="inbound", created_at__gte=cutoff)
-    total = inbound.count()
-    if not total:
+def _intent_accuracy(cutoff: datetime) -> float:
+    counts = ConversationMessage.objects.filter(
+        direction=MessageDirection.INBOUND, created_at__gte=cutoff
+    ).aggregate(
+        total=Count("id"),
+        confident=Count("id", filter=~Q(intent__in={"clarify", "unknown"})),
+    )
+    if not counts["total"]:
         return 1.0
-    confident = inbound.exclude(intent__in={"clarify", "unknown"}).count()
-    return confident / total
+    return counts["confident"] / counts["total"]
 
 
-def _grounded_answer_rate(days: int) -> float:
-    cutoff = timezone.now() - timedelta(days=days)
-    logs = LLMRequestLog.objects.filter(created_at__gte=cutoff, success=True)
-    total = logs.count()
-    if not total:
+def _grounded_answer_rate(cutoff: datetime) -> float:
+    # EXISTS stops at the first retrieval row, avoiding the join + DISTINCT over the fan-out
+    has_retrievals = Exists(RetrievalLog.objects.filter(llm_log=OuterRef("pk")))
+    counts = LLMRequestLog.objects.filter(created_at__gte=cutoff, success=True).aggregate(
+        total=Count("id"),
+        grounded=Count("id", filter=has_retrievals),
+    )
+    if not counts["total"]:
         return 1.0
-    grounded = logs.filter(retrievals__isnull=False).distinct().count()
-    return grounded / total
+    return counts["grounded"] / counts["total"]
 
 
-def _handoff_rate(days: int) -> float:
-    cutoff = timezone.now() - timedelta(days=days)
-    conversations = Conversation.objects.filter(updated_at__gte=cutoff)
-    total = conversations.count()
-    if not total:
+def _handoff_rate(cutoff: datetime) -> float:
+    counts = Conversation.objects.filter(updated_at__gte=cutoff).aggregate(
+        total=Count("id"),
+        handoffs=Count("id", filter=Q(handoff_required=True)),
+    )
+    if not counts["total"]:
         return 0.0
-    handoffs = conversations.filter(handoff_required=True).count()
-    return handoffs / total
+    return counts["handoffs"] / counts["total"]
 
 
-def _delivery_fail_rate(days: int) -> float:
-    cutoff = timezone.now() - timedelta(days=days)
-    messages = OutboxMessage.objects.filter(created_at__gte=cutoff)
-    total = messages.filter(status__in=[OutboxStatus.SENT, OutboxStatus.DELIVERED, OutboxStatus.FAILED]).count()
-    if not total:
+def _delivery_fail_rate(cutoff: datetime) -> float:
+    counts = OutboxMessage.objects.filter(
+        created_at__gte=cutoff,
+        status__in=[OutboxStatus.SENT, OutboxStatus.DELIVERED, OutboxStatus.FAILED],
+    ).aggregate(
+        total=Count("id"),
+        failed=Count("id", filter=Q(status=OutboxStatus.FAILED)),
+    )
+    if not counts["total"]:
         return 0.0
-    failed = messages.filter(status=OutboxStatus.FAILED).count()
-    return failed / total
+    return counts["failed"] / counts["total"]
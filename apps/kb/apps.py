@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class KnowledgeBaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.kb'
+
+    def ready(self) -> None:
+        from apps.kb import signals  # noqa: F401
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kb', '0002_knowledgechunk_language_knowledgechunk_tags'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='knowledgechunk',
+            index=models.Index(fields=['document', 'language', '-score', 'chunk_index'], name='kbchunk_lang_score_idx'),
+        ),
+    ]
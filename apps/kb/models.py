@@ -47,6 +47,13 @@ class KnowledgeChunk(TimeStampedModel):
     class Meta:
         unique_together = ("document", "chunk_index")
         ordering = ["document_id", "chunk_index"]
+        indexes = [
+            # matches the RAG top-k lookup (language filter, score DESC, chunk_index)
+            models.Index(
+                fields=["document", "language", "-score", "chunk_index"],
+                name="kbchunk_lang_score_idx",
+            )
+        ]
 
 
 class KnowledgeIndex(TimeStampedModel):
@@ -0,0 +1,28 @@
+"""Knowledge base helpers shared by the upload/publish flows and the LLM router."""
+
+from __future__ import annotations
+
+import time
+
+from django.core.cache import cache
+
+
+def _version_key(clinic_id: int) -> str:
+    return f"kb:version:{clinic_id}"
+
+
+def kb_version(clinic_id: int) -> int:
+    """Return the clinic's knowledge version, used to namespace cached answers."""
+    key = _version_key(clinic_id)
+    version = cache.get(key)
+    if version is None:
+        # a fresh timestamp (not 0/1) so an evicted counter can never revive stale answers
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_kb_version(clinic_id: int) -> None:
+    """Invalidate every cached answer for the clinic after its knowledge changes."""
+    cache.set(_version_key(clinic_id), time.time_ns(), None)
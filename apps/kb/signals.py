@@ -0,0 +1,29 @@
+"""Invalidate cached answers and index lookups whenever a clinic's index changes."""
+
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.kb.models import KnowledgeIndex
+from apps.kb.services import bump_kb_version
+
+
+def _bump_on_commit(clinic_id: int) -> None:
+    # after commit, so no process can re-cache the old state under the new version
+    transaction.on_commit(lambda: bump_kb_version(clinic_id))
+
+
+@receiver(post_save, sender=KnowledgeIndex)
+@receiver(post_delete, sender=KnowledgeIndex)
+def knowledge_index_changed(sender, instance: KnowledgeIndex, **kwargs) -> None:
+    _bump_on_commit(instance.clinic_id)
+
+
+@receiver(m2m_changed, sender=KnowledgeIndex.documents.through)
+def knowledge_index_documents_changed(sender, instance, action: str, **kwargs) -> None:
+    # instance is the index, or the document on reverse (document.indices) changes;
+    # both belong to the clinic whose answers are now stale
+    if action.startswith("post_"):
+        _bump_on_commit(instance.clinic_id)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0002_llmrequestlog_cost_estimate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='llmrequestlog',
+            index=models.Index(fields=['created_at', 'success'], name='llm_llmrequ_created_1f2135_idx'),
+        ),
+    ]
@@ -29,6 +29,9 @@ class LLMRequestLog(TimeStampedModel):
     latency_ms = models.PositiveIntegerField(default=0)
     cost_estimate = models.DecimalField(max_digits=8, decimal_places=5, default=0)
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "success"])]
+
 
 class RetrievalLog(TimeStampedModel):
     """Records which chunks were used for RAG answers."""
@@ -2,33 +2,156 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
 from typing import Iterable, List, Tuple
 
+import orjson
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db.models import Sum
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Sum, Value, When
 from django.utils import timezone
+from requests.adapters import HTTPAdapter
 
 from apps.clinics.models import Clinic, LanguageChoices
 from apps.conversations.models import Conversation, SessionState
 from apps.kb.models import KnowledgeChunk, KnowledgeIndex
+from apps.kb.services import kb_version
 from apps.llm.models import LLMProvider, LLMRequestLog, RetrievalLog
 
 logger = logging.getLogger(__name__)
 
+# daily spend is cached as an integer count of the smallest cost_estimate unit so the
+# running total can be bumped with an atomic cache.incr()
+COST_UNIT = Decimal("0.00001")
+LLM_ANSWER_CACHE_SECONDS = int(getattr(settings, "LLM_ANSWER_CACHE_SECONDS", 3600))
+NOT_UNDERSTOOD_MARKER = "I don't have that information"
+
+# retrieval only reads these; skipping the embedding vector and metadata keeps rows narrow
+RAG_CHUNK_FIELDS = ("id", "content", "score", "chunk_index", "language")
+RAG_INDEX_CACHE_SECONDS = int(getattr(settings, "RAG_INDEX_CACHE_SECONDS", 300))
+
+SYSTEM_PROMPT = (
+    "You are an appointment assistant for a dental clinic.\n"
+    "- Only answer with facts from the supplied context.\n"
+    "- Never invent pricing, policies, or medical advice. If missing, reply with \"I'm sorry, I don't have that information.\"\n"
+    "- Keep responses under two sentences.\n"
+    "- If the user goes off-topic, politely state so in one sentence and steer back to dental appointments.\n"
+    "- Stay professional and concise."
+)
+# shared by every request; only the user turn varies, so never mutate this dict
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+
+def _build_session() -> requests.Session:
+    """Keep-alive session shared by all DeepSeek calls in this process."""
+    session = requests.Session()
+    # completions are not idempotent (and are billed), so failed calls are never retried
+    session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=0))
+    return session
+
+
+_session = _build_session()
+
+
+def _spend_cache_key(day: date) -> str:
+    return f"llm:cost:{day.isoformat()}"
+
+
+def warm_budget_counter() -> int:
+    """Seed today's spend counter from the request log; returns the spend in cost units.
+
+    Called on worker boot and on a cache miss. The counter lives in the shared cache
+    so every web and worker process spends against one total. It expires an hour
+    after midnight, by which time the next day's key has taken over.
+    """
+    now = timezone.now()
+    today = now.date()
+    total = (
+        LLMRequestLog.objects.filter(created_at__date=today)
+        .aggregate(total=Sum("cost_estimate"))
+        .get("total")
+        or Decimal("0")
+    )
+    spent = _cost_units(total)
+    key = _spend_cache_key(today)
+    midnight = datetime.combine(today + timedelta(days=1), time.min, tzinfo=now.tzinfo)
+    timeout = int((midnight - now).total_seconds()) + 3600
+    # add() so a counter another worker has already advanced is not overwritten
+    if not cache.add(key, spent, timeout):
+        spent = cache.get(key, spent)
+    return spent
+
+
+def _answer_cache_key(clinic_id: int, language: str, prompt: str) -> str:
+    digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+    # the KB version rotates the namespace whenever the clinic's knowledge is republished
+    return f"llm:ans:{clinic_id}:{kb_version(clinic_id)}:{language}:{digest}"
+
+
+def _active_index_id(clinic_id: int, name: str) -> int | None:
+    # the KB version in the key drops the mapping whenever the clinic republishes
+    key = f"kb:index:{clinic_id}:{kb_version(clinic_id)}:{name}"
+    index_id = cache.get(key)
+    if index_id is None:
+        index_id = (
+            KnowledgeIndex.objects.filter(clinic_id=clinic_id, name=name, is_active=True)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if index_id is not None:
+            cache.set(key, index_id, RAG_INDEX_CACHE_SECONDS)
+    return index_id
+
+
+def _cost_units(amount: Decimal) -> int:
+    return int(amount / COST_UNIT)
+
 
 class LLMRouterError(RuntimeError):
     """Raised for recoverable router errors."""
 
 
+@dataclass(slots=True)
+class _PendingCompletion:
+    """State carried from the ORM preparation phase across the DeepSeek call."""
+
+    prompt: str
+    messages: list[dict]
+    grounded_chunks: List[Tuple[int, float]]
+    cache_key: str | None
+    conversation: Conversation | None
+    session_state: SessionState | None
+
+
+@dataclass(slots=True)
+class _StreamedReply:
+    """What the streaming DeepSeek call hands back to the logging phase."""
+
+    status_code: int
+    content: str = ""
+    error_text: str = ""
+    metadata: dict = field(default_factory=dict)
+    ttft_ms: int | None = None
+    total_ms: int = 0
+
+
+def _elapsed_ms(start: datetime) -> int:
+    return int((timezone.now() - start).total_seconds() * 1000)
+
+
 class LLMRouter:
     """Resolve gray intents via DeepSeek constrained by knowledge base chunks."""
 
     def __init__(self) -> None:
         self.api_key = settings.DEEPSEEK_API_KEY
         self.api_base = settings.DEEPSEEK_API_BASE.rstrip("/")
+        self.completions_url = f"{self.api_base}/v1/chat/completions"
         self.model = getattr(settings, "LLM_DEFAULT_MODEL", "deepseek-chat")
         self.top_k = getattr(settings, "RAG_TOP_K", 4)
         self.max_tokens = getattr(settings, "RAG_MAX_TOKENS", 1000)
@@ -46,29 +169,72 @@ class LLMRouter:
         prompt: str,
         conversation_id: int | None = None,
     ) -> str:
+        pending = self._prepare(clinic, language, prompt, conversation_id)
+        if isinstance(pending, str):
+            return pending
+        return self._finish(pending, self._post(pending.messages))
+
+    async def aanswer(
+        self,
+        *,
+        clinic: Clinic,
+        language: str,
+        prompt: str,
+        conversation_id: int | None = None,
+    ) -> str:
+        """Async ``answer``: ORM phases on Django's shared sync thread, the API call off it.
+
+        Concurrent callers (e.g. ``asyncio.gather`` over a webhook batch) overlap their
+        DeepSeek round trips on the pooled session instead of queueing behind each other.
+        """
+        pending = await sync_to_async(self._prepare, thread_sensitive=True)(
+            clinic, language, prompt, conversation_id
+        )
+        if isinstance(pending, str):
+            return pending
+        reply = await sync_to_async(self._post, thread_sensitive=False)(pending.messages)
+        return await sync_to_async(self._finish, thread_sensitive=True)(pending, reply)
+
+    def _prepare(
+        self,
+        clinic: Clinic,
+        language: str,
+        prompt: str,
+        conversation_id: int | None,
+    ) -> str | _PendingCompletion:
+        """Return a cached answer, or everything the API call and its logging need."""
         if not self.api_key:
             raise LLMRouterError("DeepSeek API key not configured.")
 
+        # FAQ-style prompts repeat; a hit skips retrieval, the budget check and the API call
+        cache_key = None
+        if LLM_ANSWER_CACHE_SECONDS:
+            cache_key = _answer_cache_key(clinic.id, language, prompt)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         conversation: Conversation | None = None
         session_state: SessionState | None = None
         if conversation_id:
             conversation = Conversation.objects.filter(pk=conversation_id).first()
             if conversation:
-                session_state, _ = SessionState.objects.get_or_create(conversation=conversation)
+                session_state = SessionState.objects.for_conversation(conversation)
 
         if not self._budget_available():
             self._mark_economy_mode(session_state, conversation)
             raise LLMRouterError("llm_budget_exhausted")
 
-        chunks = self._retrieve_chunks(clinic, language)
-        context_text, grounded_chunks = self._build_context(chunks)
+        # only (chunk_id, score) pairs outlive this line; the ORM rows are freed before the API call
+        context_text, grounded_chunks = self._build_context(
+            self._retrieve_chunks(clinic, language)
+        )
         if not grounded_chunks:
             self._register_not_understood(session_state, conversation)
             raise LLMRouterError("rag_context_missing")
 
-        guardrails = self._system_prompt()
         messages = [
-            {"role": "system", "content": guardrails},
+            SYSTEM_MESSAGE,
             {
                 "role": "user",
                 "content": (
@@ -77,59 +243,116 @@ class LLMRouter:
                 ),
             },
         ]
+        return _PendingCompletion(
+            prompt=prompt,
+            messages=messages,
+            grounded_chunks=grounded_chunks,
+            cache_key=cache_key,
+            conversation=conversation,
+            session_state=session_state,
+        )
 
+    def _post(self, messages: list[dict]) -> _StreamedReply | None:
+        """Stream a DeepSeek completion; no ORM access, so it may run on any thread.
+
+        Returns ``None`` on timeout; a dropped connection or a malformed event comes
+        back as a 502 reply so it takes the provider-error path. Reading stops early
+        once the latency budget is spent, since such a reply is discarded anyway.
+        """
         start = timezone.now()
         try:
-            response = requests.post(
-                f"{self.api_base}/v1/chat/completions",
+            with _session.post(
+                self.completions_url,
                 json={
                     "model": self.model,
                     "messages": messages,
                     "temperature": 0.1,
+                    "stream": True,
                 },
                 headers={
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json",
                 },
                 timeout=getattr(settings, "LLM_TIMEOUT_SECONDS", 15),
-            )
-        except requests.Timeout as exc:  # pragma: no cover - network path
+                stream=True,
+            ) as response:
+                reply = _StreamedReply(status_code=response.status_code)
+                if response.status_code >= 400:
+                    reply.error_text = response.text
+                    return reply
+                parts: List[str] = []
+                for line in response.iter_lines():
+                    # server-sent events: "data: {json}" per delta, "data: [DONE]" to finish
+                    if not line.startswith(b"data: "):
+                        continue
+                    data = line[6:]
+                    if data == b"[DONE]":
+                        break
+                    chunk = orjson.loads(data)
+                    reply.metadata.setdefault("id", chunk.get("id"))
+                    if chunk.get("usage"):
+                        reply.metadata["usage"] = chunk["usage"]
+                    for choice in chunk.get("choices") or ():
+                        delta = (choice.get("delta") or {}).get("content")
+                        if delta:
+                            if reply.ttft_ms is None:
+                                reply.ttft_ms = _elapsed_ms(start)
+                            parts.append(delta)
+                        if choice.get("finish_reason"):
+                            reply.metadata["finish_reason"] = choice["finish_reason"]
+                    if _elapsed_ms(start) > self.max_latency_ms:
+                        break
+        except requests.Timeout:  # pragma: no cover - network path
+            return None
+        except (requests.RequestException, orjson.JSONDecodeError) as exc:
+            return _StreamedReply(status_code=502, error_text=repr(exc))
+        reply.content = "".join(parts).strip()
+        reply.total_ms = _elapsed_ms(start)
+        return reply
+
+    def _finish(self, pending: _PendingCompletion, reply: _StreamedReply | None) -> str:
+        session_state, conversation = pending.session_state, pending.conversation
+        if reply is None:  # pragma: no cover - network path
             self._register_not_understood(session_state, conversation)
-            raise LLMRouterError("llm_timeout") from exc
+            raise LLMRouterError("llm_timeout")
 
-        latency_ms = int((timezone.now() - start).total_seconds() * 1000)
-        if latency_ms > self.max_latency_ms:
+        if reply.total_ms > self.max_latency_ms:
             self._register_not_understood(session_state, conversation)
             raise LLMRouterError("llm_latency_exceeded")
 
-        if response.status_code >= 400:
-            logger.error("DeepSeek error %s: %s", response.status_code, response.text)
+        if reply.status_code >= 400:
+            logger.error("DeepSeek error %s: %s", reply.status_code, reply.error_text)
             self._register_not_understood(session_state, conversation)
             raise LLMRouterError("llm_provider_error")
 
-        payload = response.json()
-        content = payload["choices"][0]["message"]["content"].strip()
+        content = reply.content
+        reply.metadata["total_ms"] = reply.total_ms
 
         llm_log = LLMRequestLog.objects.create(
             provider=LLMProvider.DEEPSEEK,
             model=self.model,
-            prompt=prompt,
+            prompt=pending.prompt,
             response=content,
-            request_metadata={"messages": messages},
-            response_metadata=payload,
-            latency_ms=latency_ms,
+            request_metadata={"messages": pending.messages},
+            response_metadata=reply.metadata,
+            # time to first token; the full generation time is kept in response_metadata
+            latency_ms=reply.ttft_ms if reply.ttft_ms is not None else reply.total_ms,
             success=True,
             cost_estimate=self.cost_per_request,
         )
-        for chunk in grounded_chunks:
-            RetrievalLog.objects.create(
-                llm_log=llm_log,
-                chunk=chunk,
-                relevance_score=chunk.score,
-            )
+        self._record_spend()
+        RetrievalLog.objects.bulk_create(
+            [
+                RetrievalLog(llm_log=llm_log, chunk_id=chunk_id, relevance_score=score)
+                for chunk_id, score in pending.grounded_chunks
+            ]
+        )
 
-        if "I don't have that information" in content:
+        if NOT_UNDERSTOOD_MARKER in content:
             self._register_not_understood(session_state, conversation)
+        elif pending.cache_key:
+            # fallback replies are not cached so each one still counts toward handoff
+            cache.set(pending.cache_key, content, LLM_ANSWER_CACHE_SECONDS)
 
         return content
 
@@ -137,14 +360,20 @@ class LLMRouter:
     def _budget_available(self) -> bool:
         if not self.daily_budget:
             return True
-        today = timezone.now().date()
-        total = (
-            LLMRequestLog.objects.filter(created_at__date=today)
-            .aggregate(total=Sum("cost_estimate"))
-            .get("total")
-            or Decimal("0")
-        )
-        return (total + self.cost_per_request) <= self.daily_budget
+        # one cache GET and an integer compare; SQL only runs to seed a cold counter
+        spent = cache.get(_spend_cache_key(timezone.now().date()))
+        if spent is None:
+            spent = warm_budget_counter()
+        return spent + _cost_units(self.cost_per_request) <= _cost_units(self.daily_budget)
+
+    def _record_spend(self) -> None:
+        if not self.daily_budget:
+            return
+        try:
+            cache.incr(_spend_cache_key(timezone.now().date()), _cost_units(self.cost_per_request))
+        except ValueError:
+            # counter not seeded (or evicted); the next budget check re-sums from the log
+            pass
 
     def _mark_economy_mode(self, session_state: SessionState | None, conversation: Conversation | None) -> None:
         if not session_state:
@@ -172,19 +401,11 @@ class LLMRouter:
             conversation.handoff_required = True
             conversation.save(update_fields=["handoff_required", "updated_at"])
 
-    def _system_prompt(self) -> str:
-        return (
-            "You are an appointment assistant for a dental clinic.\n"
-            "- Only answer with facts from the supplied context.\n"
-            "- Never invent pricing, policies, or medical advice. If missing, reply with \"I'm sorry, I don't have that information.\"\n"
-            "- Keep responses under two sentences.\n"
-            "- If the user goes off-topic, politely state so in one sentence and steer back to dental appointments.\n"
-            "- Stay professional and concise."
-        )
-
-    def _build_context(self, chunks: List[KnowledgeChunk]) -> Tuple[str, List[KnowledgeChunk]]:
+    def _build_context(
+        self, chunks: List[KnowledgeChunk]
+    ) -> Tuple[str, List[Tuple[int, float]]]:
         char_budget = self.max_tokens * self.chars_per_token
-        selected: List[KnowledgeChunk] = []
+        selected: List[Tuple[int, float]] = []
         parts: List[str] = []
         running = 0
         for chunk in chunks:
@@ -196,44 +417,25 @@ class LLMRouter:
                 break
             parts.append(f"- {snippet}")
             running += addition
-            selected.append(chunk)
+            selected.append((chunk.id, chunk.score))
         return "\n".join(parts), selected
 
     def _retrieve_chunks(self, clinic: Clinic, language: str) -> List[KnowledgeChunk]:
         desired_language = language or LanguageChoices.ENGLISH
-        try:
-            index = KnowledgeIndex.objects.get(
-                clinic=clinic,
-                name=getattr(settings, "RAG_INDEX_NAME", "default"),
-                is_active=True,
-            )
-        except KnowledgeIndex.DoesNotExist:
+        index_id = _active_index_id(clinic.id, getattr(settings, "RAG_INDEX_NAME", "default"))
+        if index_id is None:
             return []
 
-        primary = list(
-            KnowledgeChunk.objects.filter(
-                document__clinic=clinic,
-                language=desired_language,
-                document__indices=index,
-            )
-            .order_by("-score", "chunk_index")[: self.top_k]
-        )
-
-        if len(primary) >= self.top_k:
-            return primary
-
-        fallback = list(
-            KnowledgeChunk.objects.filter(
-                document__clinic=clinic,
-                document__indices=index,
+        # one query: chunks in the requested language rank first, the rest fill any gap
+        return list(
+            KnowledgeChunk.objects.filter(document__clinic=clinic, document__indices=index_id)
+            .annotate(
+                language_rank=Case(
+                    When(language=desired_language, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
             )
-            .exclude(language=desired_language)
-            .order_by("-score", "chunk_index")[: self.top_k]
+            .only(*RAG_CHUNK_FIELDS)
+            .order_by("language_rank", "-score", "chunk_index")[: self.top_k]
         )
-        combined: List[KnowledgeChunk] = primary[:]
-        for chunk in fallback:
-            if chunk not in combined:
-                combined.append(chunk)
-            if len(combined) >= self.top_k:
-                break
-        return combined
@@ -1,16 +1,25 @@
 """Utility helpers for patient data normalization."""
 
 import re
+from functools import lru_cache
 
 
 PHONE_CLEANER = re.compile(r"[^\d+]")
+# every ASCII byte except digits and "+"; bytes.translate deletes them in one C pass
+_ASCII_PHONE_JUNK = bytes(c for c in range(128) if chr(c) not in "+0123456789")
 
 
+# the same senders arrive over and over (dedupe, patient lookup, batched webhooks)
+@lru_cache(maxsize=4096)
 def normalize_phone_number(raw: str) -> str:
     """Normalize phone numbers to E.164-ish format without whitespace."""
     if not raw:
         return ""
-    cleaned = PHONE_CLEANER.sub("", raw)
+    if raw.isascii():
+        cleaned = raw.encode("ascii").translate(None, _ASCII_PHONE_JUNK).decode("ascii")
+    else:
+        # \d also keeps non-ASCII decimal digits (e.g. Arabic-Indic), so stay on the regex
+        cleaned = PHONE_CLEANER.sub("", raw)
     if cleaned.startswith("00"):
         cleaned = "+" + cleaned[2:]
     if not cleaned.startswith("+"):
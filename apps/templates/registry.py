@@ -0,0 +1,13 @@
+"""Language-keyed names of the HSM templates the backend sends on its own."""
+
+from __future__ import annotations
+
+WELCOME_TEMPLATES: dict[str, str] = {
+    "en": "whatsapp_welcome_en",
+    "ar": "whatsapp_welcome_ar",
+}
+
+
+def welcome_template_name(language: str) -> str:
+    """Welcome HSM for ``language``; unknown languages get the English template."""
+    return WELCOME_TEMPLATES.get(language, WELCOME_TEMPLATES["en"])
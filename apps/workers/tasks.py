@@ -2,15 +2,35 @@
 
 from __future__ import annotations
 
-import hashlib
 import logging
+import math
+import random
+from collections import defaultdict
 from datetime import timedelta
 
 from celery import shared_task
+from celery.signals import worker_ready
 from django.conf import settings
+from django.contrib.postgres.fields.ranges import RangeStartsWith
 from django.core.cache import cache
-from django.db import transaction
-from django.db.models import F
+from django.db import OperationalError, connection, transaction
+from django.db.models import (
+    Case,
+    CharField,
+    DateTimeField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    Func,
+    JSONField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+    prefetch_related_objects,
+)
+from django.db.models.functions import JSONObject, Least, Left, Power, Random
 from django.utils import timezone
 
 from apps.appointments.models import (
@@ -22,22 +42,116 @@ from apps.calendars.models import GoogleCredential
 from apps.calendars.services import GoogleCalendarService, GoogleCalendarServiceError
 from apps.channels.models import MessageType, OutboxMessage, OutboxStatus
 from apps.channels.services import (
+    build_whatsapp_hsm,
+    bulk_enqueue_outbox,
     enqueue_whatsapp_hsm,
-    mark_outbox_delivered,
-    mark_outbox_sent,
+    mark_outbox_bulk,
+    render_deferred_payload,
 )
-from apps.conversations.models import ConversationMessage
+from apps.common.db import insert_or_get, try_advisory_lock
+from apps.conversations.models import Conversation, ConversationMessage
+from apps.llm.router import warm_budget_counter
+from apps.patients.models import Patient
+from apps.patients.utils import normalize_phone_number
+from apps.templates.registry import welcome_template_name
+from apps.webhooks.models import LeadWebhookEvent
 
 logger = logging.getLogger(__name__)
 
 OUTBOX_BATCH_SIZE = int(getattr(settings, "OUTBOX_DISPATCH_BATCH_SIZE", 50))
 OUTBOX_BACKOFF_MAX_SECONDS = int(getattr(settings, "OUTBOX_BACKOFF_MAX_SECONDS", 300))
+OUTBOX_LOCK_TIMEOUT_MS = int(getattr(settings, "OUTBOX_LOCK_TIMEOUT_MS", 50))
+OUTBOX_STATEMENT_TIMEOUT_MS = int(getattr(settings, "OUTBOX_STATEMENT_TIMEOUT_MS", 500))
 
 GOOGLE_SYNC_MAX_ATTEMPTS = int(getattr(settings, "GOOGLE_SYNC_MAX_ATTEMPTS", 5))
 GOOGLE_SYNC_INITIAL_DELAY = int(getattr(settings, "GOOGLE_SYNC_INITIAL_DELAY", 60))
 GOOGLE_SYNC_MAX_DELAY = int(getattr(settings, "GOOGLE_SYNC_MAX_DELAY", 1800))
 GOOGLE_SYNC_CACHE_SECONDS = int(getattr(settings, "GOOGLE_SYNC_CACHE_SECONDS", 120))
 GOOGLE_SYNC_SWEEP_BATCH = int(getattr(settings, "GOOGLE_SYNC_SWEEP_BATCH", 25))
+GOOGLE_SYNC_SWEEP_LOCK = "appt-google-sweep"
+GOOGLE_SYNC_SWEEP_DUE_KEY = "appt-google-sweep:claimed"
+GOOGLE_SYNC_SWEEP_MIN_INTERVAL = int(getattr(settings, "GOOGLE_SYNC_SWEEP_MIN_INTERVAL", 30))
+GOOGLE_SYNC_SWEEP_MAX_INTERVAL = int(getattr(settings, "GOOGLE_SYNC_SWEEP_MAX_INTERVAL", 600))
+# what the task and GoogleCalendarService._appointment_to_payload read; the wide
+# text and audit columns of the joined rows are left behind
+GOOGLE_SYNC_APPOINTMENT_FIELDS = (
+    "id",
+    "clinic_id",
+    "service_id",
+    "patient_id",
+    "slot",
+    "notes",
+    "sync_state",
+    "google_retry_count",
+    "external_event_id",
+    "clinic__id",
+    "clinic__tz",
+    "service__id",
+    "service__name",
+    "patient__id",
+    "patient__email",
+)
+GOOGLE_CREDENTIAL_CACHE_SECONDS = int(getattr(settings, "GOOGLE_CREDENTIAL_CACHE_SECONDS", 60))
+# columns create_event reads or writes; the rest (scopes, account_email, ...) stay deferred
+GOOGLE_CREDENTIAL_FIELDS = (
+    "id",
+    "clinic_id",
+    "access_token",
+    "refresh_token",
+    "expires_at",
+    "calendar_id",
+    "last_error",
+    "last_error_at",
+    "updated_at",
+)
+
+RETENTION_BATCH_SIZE = int(getattr(settings, "DATA_RETENTION_BATCH_SIZE", 5000))
+
+
+@worker_ready.connect
+def warm_llm_budget_counter(**kwargs) -> None:
+    """Seed the shared LLM spend counter at boot so the first routed message skips the SUM.
+
+    The counter lives in the shared cache, so web processes read the value seeded here.
+    """
+    if not getattr(settings, "LLM_COST_BUDGET_PER_DAY", 0):
+        return
+    try:
+        warm_budget_counter()
+    except Exception:  # pragma: no cover - boot must not fail on a cold cache/DB
+        logger.exception("llm_budget.warm_failed")
+
+
+def _jittered_backoff(attempt: int, base: float, cap: float) -> float:
+    """Decorrelated jitter: uniform between ``base`` and ``min(cap, base * 3^(attempt-1))``.
+
+    Failing appointments spread out instead of re-firing together when the
+    provider recovers; the first retry still waits exactly ``base``.
+    """
+    return random.uniform(base, min(cap, base * 3 ** (attempt - 1)))
+
+
+def _credential_cache_key(clinic_id: int) -> str:
+    return f"gcred:{clinic_id}"
+
+
+def _clinic_credential(clinic_id: int) -> GoogleCredential | None:
+    """Newest Google credential for the clinic, remembering its id between retries.
+
+    A retry storm then does primary-key lookups instead of re-sorting the
+    clinic's credentials on every attempt.
+    """
+    credentials = GoogleCredential.objects.only(*GOOGLE_CREDENTIAL_FIELDS)
+    cache_key = _credential_cache_key(clinic_id)
+    credential_id = cache.get(cache_key)
+    if credential_id is not None:
+        credential = credentials.filter(pk=credential_id).first()
+        if credential is not None:
+            return credential
+    credential = credentials.filter(clinic_id=clinic_id).order_by("-updated_at").first()
+    if credential is not None:
+        cache.set(cache_key, credential.id, GOOGLE_CREDENTIAL_CACHE_SECONDS)
+    return credential
 
 
 def schedule_google_calendar_retry(appointment_id: int, countdown: int | None = None) -> bool:
@@ -62,7 +176,8 @@ def schedule_google_calendar_retry(appointment_id: int, countdown: int | None =
 def retry_google_calendar_sync(self, appointment_id: int) -> str:
     """Attempt to promote tentative appointments to confirmed Google events."""
     appointment = (
-        Appointment.objects.select_related("clinic", "service", "patient", "calendar_event")
+        Appointment.objects.select_related("clinic", "service", "patient")
+        .only(*GOOGLE_SYNC_APPOINTMENT_FIELDS)
         .filter(id=appointment_id)
         .first()
     )
@@ -77,14 +192,12 @@ def retry_google_calendar_sync(self, appointment_id: int) -> str:
     if appointment.sync_state == AppointmentSyncState.FAILED and appointment.google_retry_count >= GOOGLE_SYNC_MAX_ATTEMPTS:
         return "max_attempts"
 
-    credential: GoogleCredential | None = (
-        GoogleCredential.objects.filter(clinic=appointment.clinic).order_by("-updated_at").first()
-    )
+    credential = _clinic_credential(appointment.clinic_id)
     if credential is None:
-        appointment.sync_state = AppointmentSyncState.FAILED
-        appointment.google_last_error = "missing_google_credential"
-        appointment.save(
-            update_fields=["sync_state", "google_last_error", "updated_at"]
+        Appointment.objects.filter(pk=appointment.id).update(
+            sync_state=AppointmentSyncState.FAILED,
+            google_last_error="missing_google_credential",
+            updated_at=timezone.now(),
         )
         logger.error(
             "google_sync.no_credentials",
@@ -96,23 +209,31 @@ def retry_google_calendar_sync(self, appointment_id: int) -> str:
     try:
         event = service.create_event(appointment, credential)
     except GoogleCalendarServiceError as exc:
-        appointment.google_retry_count += 1
-        appointment.google_last_error = str(exc)
-        appointment.sync_state = (
+        # revoked or replaced tokens surface here; look the credential up afresh next time
+        cache.delete(_credential_cache_key(appointment.clinic_id))
+        attempt = appointment.google_retry_count + 1
+        sync_state = (
             AppointmentSyncState.FAILED
-            if appointment.google_retry_count >= GOOGLE_SYNC_MAX_ATTEMPTS
+            if attempt >= GOOGLE_SYNC_MAX_ATTEMPTS
             else AppointmentSyncState.TENTATIVE
         )
-        appointment.save(
-            update_fields=[
-                "sync_state",
-                "google_retry_count",
-                "google_last_error",
-                "updated_at",
-            ]
+        # compare-and-set on the count read above: a concurrent run that already
+        # recorded this attempt wins, and this one backs off instead of double-counting
+        updated = Appointment.objects.filter(
+            pk=appointment.id, google_retry_count=appointment.google_retry_count
+        ).update(
+            google_retry_count=F("google_retry_count") + 1,
+            google_last_error=str(exc),
+            sync_state=sync_state,
+            updated_at=timezone.now(),
         )
-        attempt = appointment.google_retry_count
-        if appointment.sync_state == AppointmentSyncState.FAILED:
+        if not updated:
+            logger.info(
+                "google_sync.attempt_superseded",
+                extra={"appointment_id": appointment.id, "attempt": attempt},
+            )
+            return "superseded"
+        if sync_state == AppointmentSyncState.FAILED:
             logger.error(
                 "google_sync.failed",
                 extra={
@@ -122,9 +243,8 @@ def retry_google_calendar_sync(self, appointment_id: int) -> str:
                 },
             )
             return "failed"
-        countdown = min(
-            GOOGLE_SYNC_INITIAL_DELAY * (2 ** (attempt - 1)),
-            GOOGLE_SYNC_MAX_DELAY,
+        countdown = int(
+            _jittered_backoff(attempt, GOOGLE_SYNC_INITIAL_DELAY, GOOGLE_SYNC_MAX_DELAY)
         )
         logger.warning(
             "google_sync.retry_backoff",
@@ -142,18 +262,12 @@ def retry_google_calendar_sync(self, appointment_id: int) -> str:
         )
         return "rescheduled"
 
-    appointment.external_event_id = event.external_event_id
-    appointment.sync_state = AppointmentSyncState.OK
-    appointment.google_retry_count = 0
-    appointment.google_last_error = ""
-    appointment.save(
-        update_fields=[
-            "external_event_id",
-            "sync_state",
-            "google_retry_count",
-            "google_last_error",
-            "updated_at",
-        ]
+    Appointment.objects.filter(pk=appointment.id).update(
+        external_event_id=event.external_event_id,
+        sync_state=AppointmentSyncState.OK,
+        google_retry_count=0,
+        google_last_error="",
+        updated_at=timezone.now(),
     )
     logger.info(
         "google_sync.synced",
@@ -162,145 +276,374 @@ def retry_google_calendar_sync(self, appointment_id: int) -> str:
     return "synced"
 
 
+def _sweep_interval(backlog: int) -> int:
+    """Seconds until the next sweep is due: the maximum when idle, shrinking as work piles up."""
+    interval = GOOGLE_SYNC_SWEEP_MAX_INTERVAL / (1 + math.log1p(backlog))
+    return int(max(GOOGLE_SYNC_SWEEP_MIN_INTERVAL, min(GOOGLE_SYNC_SWEEP_MAX_INTERVAL, interval)))
+
+
 @shared_task
 def sweep_tentative_google_syncs() -> int:
-    """Periodic sweep to retry pending tentative appointments."""
-    pending = (
-        Appointment.objects.filter(
+    """Periodic sweep to retry pending tentative appointments.
+
+    Beat may fire more often than sweeps are needed: each run claims the period
+    and then sets how long the claim lasts from the remaining backlog, so the
+    effective cadence adapts between the min and max intervals.
+    """
+    with try_advisory_lock(GOOGLE_SYNC_SWEEP_LOCK) as acquired:
+        # overlapping beat runs or workers: one sweeps, the rest skip the scan entirely
+        if not acquired:
+            logger.info("google_sync.sweep_skipped")
+            return 0
+        if not cache.add(GOOGLE_SYNC_SWEEP_DUE_KEY, True, GOOGLE_SYNC_SWEEP_MIN_INTERVAL):
+            return 0
+        eligible = Appointment.objects.filter(
             sync_state=AppointmentSyncState.TENTATIVE,
             google_retry_count__lt=GOOGLE_SYNC_MAX_ATTEMPTS,
             external_event_id__isnull=True,
         )
-        .order_by("updated_at")[:GOOGLE_SYNC_SWEEP_BATCH]
+        with transaction.atomic():
+            # rows a retry task is writing right now are skipped rather than waited on
+            pending_ids = list(
+                eligible.select_for_update(skip_locked=True)
+                .order_by("updated_at")
+                .values_list("id", flat=True)[:GOOGLE_SYNC_SWEEP_BATCH]
+            )
+        backlog = 0
+        if len(pending_ids) == GOOGLE_SYNC_SWEEP_BATCH:
+            backlog = eligible.count() - len(pending_ids)
+        # release the claim one min interval early: a claim of exactly the beat period
+        # is still held when the next tick lands and would halve the cadence
+        claim_seconds = _sweep_interval(backlog) - GOOGLE_SYNC_SWEEP_MIN_INTERVAL
+        if claim_seconds > 0:
+            cache.set(GOOGLE_SYNC_SWEEP_DUE_KEY, True, claim_seconds)
+        else:
+            cache.delete(GOOGLE_SYNC_SWEEP_DUE_KEY)
+        # enqueue after the row locks are released, never while holding them
+        scheduled = 0
+        for appointment_id in pending_ids:
+            if schedule_google_calendar_retry(appointment_id):
+                scheduled += 1
+        return scheduled
+
+
+def _merge_metadata(**values) -> Func:
+    """``metadata || jsonb_build_object(...)``: set keys on the JSON column inside an UPDATE."""
+    return Func(
+        F("metadata"),
+        JSONObject(**values),
+        template="%(expressions)s",
+        arg_joiner=" || ",
+        output_field=JSONField(),
     )
-    scheduled = 0
-    for appointment in pending:
-        if schedule_google_calendar_retry(appointment.id):
-            scheduled += 1
-    return scheduled
+
+
+class _Seconds(Func):
+    """PostgreSQL interval of the given number of seconds."""
+
+    template = "MAKE_INTERVAL(secs => %(expressions)s)"
+    output_field = DurationField()
+
+
+def _outbox_backoff(now) -> ExpressionWrapper:
+    """``now`` plus a jittered delay, evaluated per row inside an UPDATE.
+
+    The SQL form of ``_jittered_backoff`` with a one-second base: each row draws
+    its own RANDOM(), so a failed batch does not come due again all at once.
+    """
+    ceiling = Least(Value(float(OUTBOX_BACKOFF_MAX_SECONDS)), Power(3, F("attempts")))
+    backoff = _Seconds(Value(1.0) + Random() * (ceiling - Value(1.0)))
+    return ExpressionWrapper(Value(now) + backoff, output_field=DateTimeField())
 
 
 @shared_task
-def dispatch_outbox_messages() -> int:
-    """Send pending outbox messages immediately (stub provider send)."""
-    now = timezone.now()
-    dispatched: list[OutboxMessage] = []
+def render_outbox_payload(outbox_id: int) -> bool:
+    """Render deferred HSM template bodies off the request path."""
+    outbox = OutboxMessage.objects.select_related("hsm_template").filter(id=outbox_id).first()
+    if outbox is None or outbox.status != OutboxStatus.PENDING:
+        return False
+    return render_deferred_payload(outbox)
+
+
+def _send_outbox_message(message: OutboxMessage) -> tuple[int, str, str]:
+    """Hand one rendered message to the provider: ``(id, provider_message_id, error)``.
 
+    Provider errors come back in the result, so one bad send fails only its row
+    instead of leaving the rest of the claimed batch in SENDING.
+    """
+    try:
+        # stub provider: sent and delivered in one transition
+        return message.id, f"simulated-{message.id}", ""
+    except Exception as exc:  # pragma: no cover - network/provider stub
+        return message.id, "", str(exc)
+
+
+_OUTBOX_SENDING_SQL = (
+    f"UPDATE {connection.ops.quote_name(OutboxMessage._meta.db_table)} "
+    "SET status = %s, attempts = attempts + 1, "
+    "metadata = metadata || jsonb_build_object('last_attempt_started_at', %s::text), "
+    "updated_at = %s "
+    "WHERE id IN ({claim}) RETURNING *"
+)
+
+
+def _claim_outbox_batch(now) -> list[OutboxMessage]:
+    """Lock a batch of due messages, hold or mark them SENDING, and return those to send."""
     with transaction.atomic():
-        candidates = list(
-            OutboxMessage.objects.select_for_update(skip_locked=True)
-            .filter(
-                status=OutboxStatus.PENDING,
-                scheduled_for__lte=now,
-                attempts__lt=F("max_attempts"),
+        with connection.cursor() as cursor:
+            # a stalled lock or scan gives up quickly instead of pinning a worker slot
+            cursor.execute(
+                f"SET LOCAL lock_timeout = {OUTBOX_LOCK_TIMEOUT_MS}; "
+                f"SET LOCAL statement_timeout = {OUTBOX_STATEMENT_TIMEOUT_MS}"
             )
-            .order_by("scheduled_for")[:OUTBOX_BATCH_SIZE]
+        due = OutboxMessage.objects.filter(
+            status=OutboxStatus.PENDING,
+            scheduled_for__lte=now,
+            attempts__lt=F("max_attempts"),
+        )
+        awaiting_template = Q(message_type=MessageType.HSM, hsm_template__isnull=True)
+        # HSMs whose template is not approved yet are parked in one UPDATE and never
+        # take a slot in the send batch; bounded like the claim so a large held backlog
+        # (e.g. a revoked template) cannot push the transaction past its statement timeout
+        OutboxMessage.objects.filter(
+            id__in=due.filter(awaiting_template)
+            .select_for_update(skip_locked=True)
+            .order_by()
+            .values("id")[:OUTBOX_BATCH_SIZE]
+        ).update(
+            scheduled_for=now + timedelta(minutes=30),
+            metadata=_merge_metadata(hold_reason=Value("awaiting_template_approval")),
+            updated_at=now,
         )
+        # claim and transition in one round trip:
+        # UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED LIMIT n) RETURNING
+        claim_sql, claim_params = (
+            due.exclude(awaiting_template)
+            .select_for_update(skip_locked=True)
+            .order_by("scheduled_for")
+            .values("id")[:OUTBOX_BATCH_SIZE]
+            .query.sql_with_params()
+        )
+        dispatched = list(
+            OutboxMessage.objects.raw(
+                _OUTBOX_SENDING_SQL.format(claim=claim_sql),
+                [OutboxStatus.SENDING, now.isoformat(), now, *claim_params],
+            )
+        )
+        # the render task may not have run yet; never send a template stub
+        prefetch_related_objects(
+            [message for message in dispatched if message.hsm_template_id], "hsm_template"
+        )
+        rendered = [
+            message for message in dispatched if render_deferred_payload(message, save=False)
+        ]
+        # updated_at already carries ``now`` from the RETURNING row
+        OutboxMessage.objects.bulk_update(rendered, ["payload", "updated_at"])
+    return dispatched
 
-        for message in candidates:
-            if message.message_type == MessageType.HSM and message.hsm_template is None:
-                message.scheduled_for = now + timedelta(minutes=30)
-                message.metadata["hold_reason"] = "awaiting_template_approval"
-                message.save(update_fields=["scheduled_for", "metadata", "updated_at"])
-                continue
 
-            message.status = OutboxStatus.SENDING
-            message.attempts += 1
-            message.metadata["last_attempt_started_at"] = now.isoformat()
-            message.save(update_fields=["status", "attempts", "metadata", "updated_at"])
-            dispatched.append(message)
-
-    for message in dispatched:
-        try:
-            mark_outbox_sent(message, provider_message_id=f"simulated-{message.id}")
-            mark_outbox_delivered(message)
-        except Exception as exc:  # pragma: no cover - network/provider stub
-            message.status = (
-                OutboxStatus.FAILED
-                if message.attempts < message.max_attempts
-                else OutboxStatus.CANCELLED
-            )
-            backoff_seconds = min(OUTBOX_BACKOFF_MAX_SECONDS, 2 ** message.attempts)
-            message.last_error = str(exc)
-            message.scheduled_for = timezone.now() + timedelta(seconds=backoff_seconds)
-            message.save(
-                update_fields=["status", "last_error", "scheduled_for", "updated_at"]
-            )
+@shared_task
+def dispatch_outbox_messages() -> int:
+    """Send pending outbox messages immediately (stub provider send)."""
+    try:
+        dispatched = _claim_outbox_batch(timezone.now())
+    except OperationalError:
+        # lock/statement timeout: the batch rolled back untouched and the next beat retries
+        logger.warning("outbox.dispatch_timeout")
+        return 0
+
+    results = [_send_outbox_message(message) for message in dispatched]
+    mark_outbox_bulk(
+        [
+            (outbox_id, OutboxStatus.DELIVERED, provider_message_id)
+            for outbox_id, provider_message_id, error in results
+            if not error
+        ]
+    )
+    failed: dict[str, list[int]] = defaultdict(list)
+    for outbox_id, _, error in results:
+        if error:
+            failed[error].append(outbox_id)
+    failed_at = timezone.now()
+    for error, outbox_ids in failed.items():
+        # attempts was already bumped in the SENDING transition, so one UPDATE per
+        # distinct error settles status and backoff without reading the rows back
+        OutboxMessage.objects.filter(id__in=outbox_ids).update(
+            status=Case(
+                When(attempts__lt=F("max_attempts"), then=Value(OutboxStatus.FAILED)),
+                default=Value(OutboxStatus.CANCELLED),
+            ),
+            last_error=error,
+            scheduled_for=_outbox_backoff(failed_at),
+            updated_at=failed_at,
+        )
 
     return len(dispatched)
 
 
 @shared_task
 def retry_outbox_failures() -> int:
-    """Retry failed outbox entries with exponential backoff."""
+    """Retry failed outbox entries with jittered exponential backoff."""
     now = timezone.now()
-    retry_count = 0
-    failures = OutboxMessage.objects.filter(
-        status=OutboxStatus.FAILED, attempts__lt=F("max_attempts")
+    return OutboxMessage.objects.filter(
+        status=OutboxStatus.FAILED,
+        attempts__lt=F("max_attempts"),
+        scheduled_for__lte=now,
+    ).update(
+        status=OutboxStatus.PENDING,
+        scheduled_for=_outbox_backoff(now),
+        updated_at=now,
     )
-    for message in failures:
-        backoff_seconds = min(OUTBOX_BACKOFF_MAX_SECONDS, 2 ** message.attempts)
-        if message.scheduled_for <= now:
-            message.status = OutboxStatus.PENDING
-            message.scheduled_for = now + timedelta(seconds=backoff_seconds)
-            message.save(update_fields=["status", "scheduled_for", "updated_at"])
-            retry_count += 1
-    return retry_count
+
+
+@shared_task
+def process_lead_webhook(event_id: int) -> str:
+    """Create the lead's patient and conversation, then queue the welcome HSM."""
+    with transaction.atomic():
+        # a redelivery re-queues the task while the first run may still be going:
+        # the row lock serialises the runs and the second one sees processed=True
+        event = (
+            LeadWebhookEvent.objects.select_for_update(of=("self",))
+            .select_related("clinic")
+            .filter(id=event_id)
+            .first()
+        )
+        if event is None:
+            return "missing"
+        if event.processed:
+            return "already_processed"
+
+        clinic = event.clinic
+        payload = event.payload
+        phone = payload.get("phone", "")
+        language = payload.get("language", "en")
+
+        patient, _ = insert_or_get(
+            Patient,
+            ["clinic", "normalized_phone"],
+            {
+                "clinic": clinic,
+                "normalized_phone": normalize_phone_number(phone),
+                "full_name": payload.get("name", "Guest"),
+                "phone_number": phone,
+                "language": language,
+                "email": payload.get("email", ""),
+            },
+        )
+        conversation, _ = insert_or_get(
+            Conversation,
+            ["dedupe_key"],
+            {
+                "clinic": clinic,
+                "dedupe_key": Conversation.build_dedupe_key(clinic, patient.normalized_phone),
+                "patient": patient,
+                "lead_source": payload.get("source", "lead_webhook"),
+            },
+        )
+        if conversation.patient_id is None:
+            conversation.patient = patient
+            conversation.save(update_fields=["patient", "updated_at"])
+
+        enqueue_whatsapp_hsm(
+            clinic_id=clinic.id,
+            conversation=conversation,
+            template_name=welcome_template_name(language),
+            language=language,
+            variables={"name": patient.full_name},
+            delay_seconds=5,
+            idempotency_key=f"lead-welcome:{event.id}",
+        )
+
+        event.processed = True
+        event.processed_at = timezone.now()
+        event.related_conversation = conversation
+        event.save(update_fields=["processed", "processed_at", "related_conversation", "updated_at"])
+    return "processed"
+
+
+REMINDER_OFFSETS = (
+    ("due_24h", timedelta(hours=24), "reminder_24h"),
+    ("due_2h", timedelta(hours=2), "reminder_2h"),
+)
 
 
 @shared_task
 def schedule_appointment_reminders() -> int:
     """Queue reminders at +24h and +2h before the appointment."""
     now = timezone.now()
-    upcoming = Appointment.objects.filter(
-        status__in=[AppointmentStatus.BOOKED, AppointmentStatus.CONFIRMED],
-        slot__lower__gte=now,
-        slot__lower__lte=now + timedelta(hours=24),
+    starts_at = RangeStartsWith("slot")
+    # the patient's most recent conversation (Conversation's default ordering)
+    latest_conversation = Conversation.objects.filter(patient=OuterRef("patient_id")).values("id")[:1]
+    due_times = {
+        alias: ExpressionWrapper(starts_at - offset, output_field=DateTimeField())
+        for alias, offset, _ in REMINDER_OFFSETS
+    }
+    # reminder times, the "still in the future" test and the conversation pick all run in
+    # SQL; appointments with nothing left to send never leave the database
+    upcoming = (
+        Appointment.objects.filter(
+            status__in=[AppointmentStatus.BOOKED, AppointmentStatus.CONFIRMED],
+            slot__startswith__gte=now,
+            slot__startswith__lte=now + timedelta(hours=24),
+            patient__isnull=False,
+        )
+        .annotate(conversation_id=Subquery(latest_conversation), **due_times)
+        .filter(conversation_id__isnull=False)
+        .filter(Q(due_24h__gt=now) | Q(due_2h__gt=now))
+        .values(
+            "clinic_id",
+            "conversation_id",
+            "patient__full_name",
+            "patient__language",
+            *due_times,
+        )
     )
-    queued = 0
-    for appt in upcoming:
-        if not appt.patient:
-            continue
-        in_24h = appt.slot.lower - timedelta(hours=24)
-        in_2h = appt.slot.lower - timedelta(hours=2)
-        for reminder_time, template_name in [
-            (in_24h, "reminder_24h"),
-            (in_2h, "reminder_2h"),
-        ]:
+    pending: list[OutboxMessage] = []
+    templates: dict = {}
+    for row in upcoming:
+        for alias, _, template_name in REMINDER_OFFSETS:
+            reminder_time = row[alias]
             if reminder_time <= now:
                 continue
-            conversation = appt.patient.conversations.first()
-            if not conversation:
-                continue
-            enqueue_whatsapp_hsm(
-                clinic_id=appt.clinic_id,
-                conversation=conversation,
-                template_name=template_name,
-                language=appt.patient.language,
-                variables={"name": appt.patient.full_name},
-                delay_seconds=int((reminder_time - now).total_seconds()),
+            pending.append(
+                build_whatsapp_hsm(
+                    clinic_id=row["clinic_id"],
+                    conversation_id=row["conversation_id"],
+                    template_name=template_name,
+                    language=row["patient__language"],
+                    variables={"name": row["patient__full_name"]},
+                    delay_seconds=int((reminder_time - now).total_seconds()),
+                    template_cache=templates,
+                )
             )
-            queued += 1
-    return queued
+    return bulk_enqueue_outbox(pending)
+
+
+class _BodySHA256(Func):
+    """Hex SHA-256 of a text column using PostgreSQL's built-in sha256() (no pgcrypto)."""
+
+    template = "ENCODE(SHA256(CONVERT_TO(%(expressions)s, 'UTF8')), 'hex')"
+    output_field = CharField()
 
 
 @shared_task
 def enforce_message_retention() -> int:
     """Redact PII from historical conversation messages."""
     retention_days = getattr(settings, "DATA_RETENTION_DAYS", 30)
-    cutoff = timezone.now() - timedelta(days=retention_days)
-    stale_messages = ConversationMessage.objects.filter(
-        created_at__lt=cutoff
-    ).exclude(metadata__redacted=True)[:500]
-
-    total = 0
-    for message in stale_messages:
-        digest = hashlib.sha256(message.body.encode("utf-8", "ignore")).hexdigest()
-        preview = message.body[:8]
-        message.body = "[redacted]"
-        message.metadata["redacted"] = True
-        message.metadata["body_hash"] = digest
-        message.metadata["preview"] = preview
-        message.save(update_fields=["body", "metadata", "updated_at"])
-        total += 1
-    return total
+    now = timezone.now()
+    cutoff = now - timedelta(days=retention_days)
+    stale_ids = (
+        ConversationMessage.objects.filter(created_at__lt=cutoff)
+        # containment rather than a key lookup: NOT (metadata->'redacted' = true) is NULL,
+        # and so never matches, for rows that lack the key
+        .exclude(metadata__contains={"redacted": True})
+        .values("pk")[:RETENTION_BATCH_SIZE]
+    )
+    # one UPDATE: digest and preview are computed in SQL from the pre-update body
+    return ConversationMessage.objects.filter(pk__in=stale_ids).update(
+        body="[redacted]",
+        metadata=_merge_metadata(
+            redacted=Value(True), body_hash=_BodySHA256("body"), preview=Left("body", 8)
+        ),
+        updated_at=now,
+    )
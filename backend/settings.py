@@ -140,6 +140,19 @@ else:
     }
 
 
+# Cache
+# Shared across web and worker processes: spend counters, kb_version and task
+# claims must be visible to every process, not just the one that wrote them.
+
+CACHE_URL = os.getenv("CACHE_URL", "redis://127.0.0.1:6379/1")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL,
+    }
+}
+
+
 # Password validation
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -240,6 +253,10 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
 CELERY_SWEEP_TENTATIVE_SECONDS = int(os.getenv("CELERY_SWEEP_TENTATIVE_SECONDS", "600"))
+# the sweep backs off to GOOGLE_SYNC_SWEEP_MAX_INTERVAL when idle; a beat interval
+# down to GOOGLE_SYNC_SWEEP_MIN_INTERVAL lets it speed up when retries pile up
+GOOGLE_SYNC_SWEEP_MIN_INTERVAL = int(os.getenv("GOOGLE_SYNC_SWEEP_MIN_INTERVAL", "30"))
+GOOGLE_SYNC_SWEEP_MAX_INTERVAL = int(os.getenv("GOOGLE_SYNC_SWEEP_MAX_INTERVAL", "600"))
 
 CELERY_BEAT_SCHEDULE = {
     "sweep-tentative-google-syncs": {
@@ -1,15 +1,26 @@
-import hashlib
 import hmac
 from datetime import datetime, timedelta
 
 import pytest
 from django.conf import settings
+from django.core.cache import cache
 
 from apps.clinics.models import Clinic, ClinicService, LanguageChoices
 from apps.patients.models import Patient
 from apps.patients.utils import normalize_phone_number
 
 
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    # production shares a Redis cache; tests run against an isolated LocMem one
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def clinic(db):
     return Clinic.objects.create(
@@ -41,9 +52,12 @@ def patient(clinic):
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def hmac_signature():
+    key = settings.LEAD_WEBHOOK_SECRET.encode()
+
     def _sign(payload: bytes) -> str:
-        return hmac.new(settings.LEAD_WEBHOOK_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+        # one-shot C HMAC, the same primitive the webhook view verifies with
+        return hmac.digest(key, payload, "sha256").hex()
 
     return _sign
@@ -1,8 +1,10 @@
 import json
 from datetime import datetime, time, timedelta
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
 import pytest
+from django.contrib.auth.hashers import make_password
 from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
 
@@ -13,6 +15,8 @@ from apps.clinics.models import Clinic, ClinicService, ServiceHours
 
 pytestmark = pytest.mark.django_db
 
+PASSWORD = "Admin!234"
+
 
 def _create_clinic() -> Clinic:
     return Clinic.objects.create(slug="demo", name="Demo Dental", tz="UTC", default_lang="en")
@@ -45,16 +49,38 @@ def _create_patient(clinic: Clinic):
     )
 
 
-def _make_user(django_user_model, email: str, role: ClinicMembership.Role, clinic: Clinic):
-    user = django_user_model.objects.create_user(
-        username=email,
-        email=email,
-        password="Admin!234",
-        first_name="Agent",
-        last_name="User",
-        is_active=True,
+@lru_cache(maxsize=None)
+def _password_hash() -> str:
+    # PBKDF2 dominates user setup; every test user shares one hash per session
+    return make_password(PASSWORD)
+
+
+def _make_users(django_user_model, clinic: Clinic, *specs: tuple[str, ClinicMembership.Role]):
+    """Create ``(email, role)`` members of ``clinic`` with one INSERT per table."""
+    users = django_user_model.objects.bulk_create(
+        [
+            django_user_model(
+                username=email,
+                email=email,
+                password=_password_hash(),
+                first_name="Agent",
+                last_name="User",
+                is_active=True,
+            )
+            for email, _role in specs
+        ]
     )
-    ClinicMembership.objects.create(user=user, clinic=clinic, role=role)
+    ClinicMembership.objects.bulk_create(
+        [
+            ClinicMembership(user=user, clinic=clinic, role=role)
+            for user, (_email, role) in zip(users, specs)
+        ]
+    )
+    return users
+
+
+def _make_user(django_user_model, email: str, role: ClinicMembership.Role, clinic: Clinic):
+    (user,) = _make_users(django_user_model, clinic, (email, role))
     return user
 
 
@@ -89,8 +115,12 @@ def setup_clinic(django_user_model):
     clinic = _create_clinic()
     service = _create_service(clinic)
     patient = _create_patient(clinic)
-    staff = _make_user(django_user_model, "staff@example.com", ClinicMembership.Role.STAFF, clinic)
-    viewer = _make_user(django_user_model, "viewer@example.com", ClinicMembership.Role.VIEWER, clinic)
+    staff, viewer = _make_users(
+        django_user_model,
+        clinic,
+        ("staff@example.com", ClinicMembership.Role.STAFF),
+        ("viewer@example.com", ClinicMembership.Role.VIEWER),
+    )
     return clinic, service, patient, staff, viewer
 
 
@@ -37,33 +37,64 @@ def test_double_booking_exclusion(clinic, clinic_service, patient):
         )
 
 
+def _book(clinic, clinic_service, patient, slot_range) -> Appointment:
+    return Appointment.objects.create(
+        clinic=clinic,
+        service=clinic_service,
+        patient=patient,
+        slot=slot_range,
+        status=AppointmentStatus.BOOKED,
+    )
+
+
+def _booked_count(clinic, clinic_service) -> int:
+    return Appointment.objects.filter(
+        clinic=clinic, service=clinic_service, status=AppointmentStatus.BOOKED
+    ).count()
+
+
 def test_concurrent_booking_race_condition(clinic, clinic_service, patient):
     if connection.vendor != "postgresql":
         pytest.skip("Concurrency test requires PostgreSQL backend")
 
+    # the exclusion constraint decides the race, so repeated attempts on one connection
+    # (each in its own savepoint) exercise the same guarantee as competing connections
     slot_range = make_slot(timezone.now())
+    booked = 0
+    for _ in range(10):
+        sid = transaction.savepoint()
+        try:
+            _book(clinic, clinic_service, patient, slot_range)
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+        else:
+            transaction.savepoint_commit(sid)
+            booked += 1
+
+    assert booked == 1
+    assert _booked_count(clinic, clinic_service) == 1
+
 
-    def attempt_booking():
+@pytest.mark.slow
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_booking_race_condition_threads(clinic, clinic_service, patient):
+    if connection.vendor != "postgresql":
+        pytest.skip("Concurrency test requires PostgreSQL backend")
+
+    slot_range = make_slot(timezone.now())
+
+    def attempt_booking(_):
         try:
             with transaction.atomic():
-                Appointment.objects.create(
-                    clinic=clinic,
-                    service=clinic_service,
-                    patient=patient,
-                    slot=slot_range,
-                    status=AppointmentStatus.BOOKED,
-                )
+                _book(clinic, clinic_service, patient, slot_range)
             return True
         except IntegrityError:
             return False
+        finally:
+            connection.close()
 
     with ThreadPoolExecutor(max_workers=10) as executor:
-        results = list(executor.map(lambda _: attempt_booking(), range(10)))
+        results = list(executor.map(attempt_booking, range(10)))
 
     assert sum(results) == 1
-    assert (
-        Appointment.objects.filter(
-            clinic=clinic, service=clinic_service, status=AppointmentStatus.BOOKED
-        ).count()
-        == 1
-    )
+    assert _booked_count(clinic, clinic_service) == 1
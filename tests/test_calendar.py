@@ -7,7 +7,7 @@ from django.utils import timezone
 
 from apps.appointments.models import Appointment, AppointmentStatus
 from apps.calendars.models import CalendarEvent, GoogleCredential
-from apps.calendars.services import GoogleCalendarService
+from apps.calendars.services import GoogleCalendarService, _session
 
 pytestmark = pytest.mark.django_db
 
@@ -33,8 +33,8 @@ def test_calendar_create_cancel(monkeypatch, clinic, clinic_service, patient):
         delete_calls["url"] = url
         return SimpleNamespace(status_code=204)
 
-    monkeypatch.setattr("apps.calendars.services.requests.post", fake_post)
-    monkeypatch.setattr("apps.calendars.services.requests.delete", fake_delete)
+    monkeypatch.setattr("apps.calendars.services._session.post", fake_post)
+    monkeypatch.setattr("apps.calendars.services._session.delete", fake_delete)
 
     credential = GoogleCredential.objects.create(
         clinic=clinic,
@@ -62,3 +62,9 @@ def test_calendar_create_cancel(monkeypatch, clinic, clinic_service, patient):
     event.refresh_from_db()
     assert event.sync_status == "cancelled"
     assert "events/evt-1" in delete_calls["url"]
+
+
+def test_session_returns_last_response_after_status_retries():
+    retries = _session.get_adapter("https://www.googleapis.com").max_retries
+    assert retries.raise_on_status is False
+    assert 503 in retries.status_forcelist
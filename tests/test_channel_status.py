@@ -7,6 +7,7 @@ from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from django.core.cache import cache
+from django.db import OperationalError
 
 from apps.accounts.models import AuditLog, ClinicMembership
 from apps.calendars.models import GoogleCredential
@@ -19,8 +20,10 @@ from apps.channels.models import (
     HSMTemplate,
     HSMTemplateStatus,
 )
+from apps.channels.services import mark_outbox_sent
 from apps.clinics.models import Clinic
 from apps.templates.models import MessageTemplate
+from apps.workers.tasks import dispatch_outbox_messages, retry_outbox_failures
 
 pytestmark = pytest.mark.django_db
 
@@ -369,3 +372,232 @@ def test_outbox_status_forbidden_for_viewer(client, django_user_model):
     resp = _get(client, f"/clinic/{clinic.slug}/outbox/{outbox.id}", viewer, remote="10.20.0.10")
     assert resp.status_code == 403
     assert resp.json() == {"ok": False, "error": "FORBIDDEN"}
+
+
+def test_dispatch_outbox_messages_bulk_transitions():
+    clinic = _make_clinic("dispatch")
+    now = timezone.now()
+    ready = OutboxMessage.objects.create(
+        clinic=clinic,
+        channel=ChannelType.WHATSAPP,
+        message_type="session",
+        payload={"body": "Hello"},
+        scheduled_for=now,
+        status=OutboxStatus.PENDING,
+    )
+    held = OutboxMessage.objects.create(
+        clinic=clinic,
+        channel=ChannelType.WHATSAPP,
+        message_type="hsm",
+        payload={},
+        scheduled_for=now,
+        status=OutboxStatus.PENDING,
+    )
+
+    assert dispatch_outbox_messages() == 1
+
+    ready.refresh_from_db()
+    assert ready.status == OutboxStatus.DELIVERED
+    assert ready.attempts == 1
+    assert "last_attempt_started_at" in ready.metadata
+    assert ready.payload["provider_message_id"] == f"simulated-{ready.id}"
+    assert ready.sent_at is not None and ready.delivered_at is not None
+    held.refresh_from_db()
+    assert held.status == OutboxStatus.PENDING
+    assert held.metadata["hold_reason"] == "awaiting_template_approval"
+    assert held.scheduled_for > now
+
+
+def test_dispatch_outbox_messages_renders_deferred_templates(django_assert_num_queries):
+    clinic = _make_clinic("render")
+    template = HSMTemplate.objects.create(
+        clinic=clinic,
+        name="welcome",
+        language="en",
+        body="Hi {{name}}",
+        provider_template_id="tpl-welcome",
+        status=HSMTemplateStatus.APPROVED,
+    )
+    outboxes = [
+        OutboxMessage.objects.create(
+            clinic=clinic,
+            channel=ChannelType.WHATSAPP,
+            message_type="hsm",
+            hsm_template=template,
+            payload={"deferred": True, "template_id": "tpl-welcome", "variables": {"name": name}},
+            scheduled_for=timezone.now(),
+            status=OutboxStatus.PENDING,
+        )
+        for name in ("Ana", "Ben")
+    ]
+
+    # claim savepoint + timeouts + hold UPDATE + UPDATE ... RETURNING + template fetch +
+    # one bulk render write + release, then the delivered bulk update (read + write)
+    with django_assert_num_queries(9):
+        assert dispatch_outbox_messages() == 2
+
+    for outbox, name in zip(outboxes, ("Ana", "Ben")):
+        outbox.refresh_from_db()
+        assert outbox.status == OutboxStatus.DELIVERED
+        assert outbox.payload["body"] == f"Hi {name}"
+
+
+def test_dispatch_outbox_messages_holds_do_not_take_batch_slots(monkeypatch):
+    clinic = _make_clinic("holds")
+    now = timezone.now()
+    held = [
+        OutboxMessage.objects.create(
+            clinic=clinic,
+            channel=ChannelType.WHATSAPP,
+            message_type="hsm",
+            payload={},
+            scheduled_for=now - timedelta(minutes=idx + 1),
+            status=OutboxStatus.PENDING,
+        )
+        for idx in range(2)
+    ]
+    ready = OutboxMessage.objects.create(
+        clinic=clinic,
+        channel=ChannelType.WHATSAPP,
+        message_type="session",
+        payload={"body": "Hello"},
+        scheduled_for=now,
+        status=OutboxStatus.PENDING,
+    )
+    monkeypatch.setattr("apps.workers.tasks.OUTBOX_BATCH_SIZE", 1)
+
+    assert dispatch_outbox_messages() == 1
+
+    ready.refresh_from_db()
+    assert ready.status == OutboxStatus.DELIVERED
+    # the hold UPDATE is capped at one batch per run as well
+    parked = OutboxMessage.objects.filter(
+        id__in=[outbox.id for outbox in held], metadata__hold_reason="awaiting_template_approval"
+    )
+    assert parked.count() == 1
+
+    assert dispatch_outbox_messages() == 0
+    for outbox in held:
+        outbox.refresh_from_db()
+        assert outbox.status == OutboxStatus.PENDING
+        assert outbox.attempts == 0
+        assert outbox.metadata["hold_reason"] == "awaiting_template_approval"
+
+
+def test_dispatch_outbox_messages_settles_each_send_result(monkeypatch):
+    clinic = _make_clinic("parallel")
+    now = timezone.now()
+    messages = [
+        OutboxMessage.objects.create(
+            clinic=clinic,
+            channel=ChannelType.WHATSAPP,
+            message_type="session",
+            payload={"body": f"Hello {idx}"},
+            scheduled_for=now - timedelta(seconds=idx),
+            status=OutboxStatus.PENDING,
+        )
+        for idx in range(3)
+    ]
+    rejected = messages[1].id
+
+    def fake_send(message):
+        if message.id == rejected:
+            return message.id, "", "provider rejected"
+        return message.id, f"wamid-{message.id}", ""
+
+    monkeypatch.setattr("apps.workers.tasks._send_outbox_message", fake_send)
+
+    assert dispatch_outbox_messages() == 3
+
+    for outbox in messages:
+        outbox.refresh_from_db()
+        if outbox.id == rejected:
+            assert outbox.status == OutboxStatus.FAILED
+            assert outbox.last_error == "provider rejected"
+            assert outbox.scheduled_for > now
+        else:
+            assert outbox.status == OutboxStatus.DELIVERED
+            assert outbox.provider_message_id == f"wamid-{outbox.id}"
+
+
+def test_dispatch_outbox_messages_backs_off_on_lock_timeout(monkeypatch):
+    clinic = _make_clinic("timeout")
+    outbox = OutboxMessage.objects.create(
+        clinic=clinic,
+        channel=ChannelType.WHATSAPP,
+        message_type="session",
+        payload={"body": "Hello"},
+        scheduled_for=timezone.now(),
+        status=OutboxStatus.PENDING,
+    )
+
+    def timed_out(now):
+        raise OperationalError("canceling statement due to lock timeout")
+
+    monkeypatch.setattr("apps.workers.tasks._claim_outbox_batch", timed_out)
+
+    assert dispatch_outbox_messages() == 0
+    outbox.refresh_from_db()
+    assert outbox.status == OutboxStatus.PENDING
+    assert outbox.attempts == 0
+
+
+def test_delivery_receipt_matches_provider_message_id(client):
+    clinic = _make_clinic("receipt")
+    outbox = OutboxMessage.objects.create(
+        clinic=clinic,
+        channel=ChannelType.WHATSAPP,
+        message_type="session",
+        payload={"body": "Hello"},
+        scheduled_for=timezone.now(),
+        status=OutboxStatus.SENDING,
+    )
+    mark_outbox_sent(outbox, provider_message_id="wamid-1")
+
+    resp = client.post(
+        "/channels/whatsapp/delivery",
+        data=json.dumps({"provider_message_id": "wamid-1", "status": "delivered"}),
+        content_type="application/json",
+    )
+
+    assert resp.status_code == 200
+    outbox.refresh_from_db()
+    assert outbox.provider_message_id == "wamid-1"
+    assert outbox.status == OutboxStatus.DELIVERED
+
+
+def test_retry_outbox_failures_reschedules_with_jittered_backoff():
+    clinic = _make_clinic("retry")
+    now = timezone.now()
+    failures = [
+        OutboxMessage.objects.create(
+            clinic=clinic,
+            channel=ChannelType.WHATSAPP,
+            message_type="session",
+            payload={"body": "Hello"},
+            scheduled_for=now - timedelta(seconds=1),
+            status=OutboxStatus.FAILED,
+            attempts=attempts,
+        )
+        for attempts in (2, 4)
+    ]
+    not_due = OutboxMessage.objects.create(
+        clinic=clinic,
+        channel=ChannelType.WHATSAPP,
+        message_type="session",
+        payload={"body": "Later"},
+        scheduled_for=now + timedelta(minutes=5),
+        status=OutboxStatus.FAILED,
+        attempts=1,
+    )
+
+    assert retry_outbox_failures() == 2
+
+    # jittered between one second and 3 ^ attempts
+    for outbox, ceiling in zip(failures, (9, 81)):
+        outbox.refresh_from_db()
+        assert outbox.status == OutboxStatus.PENDING
+        delay = outbox.scheduled_for - outbox.updated_at
+        assert timedelta(seconds=1) <= delay <= timedelta(seconds=ceiling)
+    not_due.refresh_from_db()
+    assert not_due.status == OutboxStatus.FAILED
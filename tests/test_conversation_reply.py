@@ -18,6 +18,7 @@ from apps.channels.services import SESSION_WINDOW_HOURS
 from apps.clinics.models import Clinic
 from apps.conversations.models import Conversation, ConversationMessage, MessageDirection
 from apps.templates.models import MessageTemplate
+from apps.workers.tasks import render_outbox_payload
 
 pytestmark = pytest.mark.django_db
 
@@ -246,6 +247,12 @@ def test_reply_outside_session_uses_hsm(client):
     assert outbox.message_type == MessageType.HSM
     assert outbox.hsm_template_id == hsm.id
     assert outbox.idempotency_key
+    assert outbox.payload["deferred"] is True
+
+    assert render_outbox_payload(outbox.id) is True
+    outbox.refresh_from_db()
+    assert outbox.payload["body"] == "Hi Omar"
+    assert "deferred" not in outbox.payload
 
     message = ConversationMessage.objects.get(pk=message_id)
     assert message.body == "Hi Omar"
@@ -1,6 +1,10 @@
+import time
 from datetime import timedelta
 
 import pytest
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from apps.appointments.models import (
@@ -11,10 +15,20 @@ from apps.appointments.models import (
 from apps.calendars.models import GoogleCredential
 from apps.clinics.models import Clinic, ClinicService
 from apps.calendars.services import GoogleCalendarServiceError
+from apps.common.db import advisory_lock_key
 from apps.workers.tasks import (
     GOOGLE_SYNC_INITIAL_DELAY,
+    GOOGLE_SYNC_SWEEP_DUE_KEY,
+    GOOGLE_SYNC_SWEEP_LOCK,
+    GOOGLE_SYNC_SWEEP_MAX_INTERVAL,
+    GOOGLE_SYNC_SWEEP_MIN_INTERVAL,
+    _clinic_credential,
+    _credential_cache_key,
+    _jittered_backoff,
+    _sweep_interval,
     retry_google_calendar_sync,
     schedule_google_calendar_retry,
+    sweep_tentative_google_syncs,
 )
 
 pytestmark = pytest.mark.django_db
@@ -54,12 +68,19 @@ def test_retry_promotes_tentative_to_ok(monkeypatch):
         def __init__(self, appointment_id):
             self.external_event_id = f"evt-{appointment_id}"
 
-    monkeypatch.setattr(
-        "apps.workers.tasks.GoogleCalendarService.create_event",
-        lambda self, appt, cred: DummyEvent(appt.id),
-    )
+    payload_queries = []
+
+    def create_event(self, appt, cred):
+        # the narrowed select must still carry everything the payload reads
+        with CaptureQueriesContext(connection) as captured:
+            self._appointment_to_payload(appt)
+        payload_queries.extend(captured.captured_queries)
+        return DummyEvent(appt.id)
+
+    monkeypatch.setattr("apps.workers.tasks.GoogleCalendarService.create_event", create_event)
 
     result = retry_google_calendar_sync.run(appointment.id)
+    assert payload_queries == []
     appointment.refresh_from_db()
     assert result == "synced"
     assert appointment.sync_state == AppointmentSyncState.OK
@@ -129,3 +150,129 @@ def test_schedule_google_calendar_retry_idempotent(monkeypatch, settings):
     assert first is True
     assert second is False
     assert calls == [f"appt-google-sync-{appointment.id}-initial"]
+
+
+def test_retry_failure_yields_to_concurrent_attempt(monkeypatch):
+    appointment = _create_appointment()
+    GoogleCredential.objects.create(
+        clinic=appointment.clinic,
+        account_email="calendar@example.com",
+        access_token="token",
+        refresh_token="refresh",
+        expires_at=timezone.now() + timedelta(hours=1),
+        calendar_id="primary",
+    )
+
+    def racing_create_event(self, appt, cred):
+        # another worker records its failed attempt while this one is in flight
+        Appointment.objects.filter(pk=appt.pk).update(google_retry_count=1)
+        raise GoogleCalendarServiceError("transient")
+
+    monkeypatch.setattr(
+        "apps.workers.tasks.GoogleCalendarService.create_event",
+        racing_create_event,
+    )
+    applied = []
+    monkeypatch.setattr(
+        "apps.workers.tasks.retry_google_calendar_sync.apply_async",
+        lambda *args, **kwargs: applied.append(kwargs),
+    )
+
+    result = retry_google_calendar_sync.run(appointment.id)
+    appointment.refresh_from_db()
+    assert result == "superseded"
+    assert appointment.google_retry_count == 1
+    assert applied == []
+
+
+def test_sweep_skips_while_another_worker_holds_the_lock(monkeypatch):
+    appointment = _create_appointment()
+    cache.delete(GOOGLE_SYNC_SWEEP_DUE_KEY)
+    scheduled = []
+    monkeypatch.setattr(
+        "apps.workers.tasks.schedule_google_calendar_retry",
+        lambda appointment_id: scheduled.append(appointment_id) or True,
+    )
+
+    key = advisory_lock_key(GOOGLE_SYNC_SWEEP_LOCK)
+    other = connections.create_connection("default")
+    try:
+        with other.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [key])
+        assert sweep_tentative_google_syncs.run() == 0
+        assert scheduled == []
+        with other.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+    finally:
+        other.close()
+
+    assert sweep_tentative_google_syncs.run() == 1
+    assert scheduled == [appointment.id]
+
+    # the period is claimed: ticks before the adaptive interval elapses do nothing
+    assert sweep_tentative_google_syncs.run() == 0
+    assert scheduled == [appointment.id]
+
+
+def test_idle_sweep_runs_again_on_the_next_beat(monkeypatch, settings):
+    _create_appointment()
+    scheduled = []
+    monkeypatch.setattr(
+        "apps.workers.tasks.schedule_google_calendar_retry",
+        lambda appointment_id: scheduled.append(appointment_id) or True,
+    )
+    beat = settings.CELERY_SWEEP_TENTATIVE_SECONDS
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    assert sweep_tentative_google_syncs.run() == 1
+    # the claim is set after the scan, so the next tick lands a little under a beat later
+    now += beat - GOOGLE_SYNC_SWEEP_MIN_INTERVAL / 2
+    assert sweep_tentative_google_syncs.run() == 1
+    assert len(scheduled) == 2
+
+
+def test_jittered_backoff_stays_within_decorrelated_bounds():
+    assert _jittered_backoff(1, 60, 1800) == 60
+    delays = {_jittered_backoff(3, 60, 1800) for _ in range(50)}
+    assert all(60 <= delay <= 540 for delay in delays)
+    assert len(delays) > 1
+    assert all(60 <= _jittered_backoff(10, 60, 1800) <= 1800 for _ in range(50))
+
+
+def test_retry_reuses_cached_credential_until_a_failure(monkeypatch, django_assert_num_queries):
+    appointment = _create_appointment()
+    credential = GoogleCredential.objects.create(
+        clinic=appointment.clinic,
+        account_email="calendar@example.com",
+        access_token="token",
+        refresh_token="refresh",
+        expires_at=timezone.now() + timedelta(hours=1),
+        calendar_id="primary",
+    )
+
+    assert _clinic_credential(appointment.clinic_id).id == credential.id
+    assert cache.get(_credential_cache_key(appointment.clinic_id)) == credential.id
+    with django_assert_num_queries(1) as captured:
+        assert _clinic_credential(appointment.clinic_id).id == credential.id
+    assert '"updated_at" DESC' not in captured.captured_queries[0]["sql"]
+
+    def revoked_create_event(self, appt, cred):
+        raise GoogleCalendarServiceError("invalid_grant")
+
+    monkeypatch.setattr(
+        "apps.workers.tasks.GoogleCalendarService.create_event",
+        revoked_create_event,
+    )
+    monkeypatch.setattr(
+        "apps.workers.tasks.retry_google_calendar_sync.apply_async", lambda *args, **kwargs: None
+    )
+    assert retry_google_calendar_sync.run(appointment.id) == "rescheduled"
+    assert cache.get(_credential_cache_key(appointment.clinic_id)) is None
+
+
+def test_sweep_interval_shrinks_as_the_backlog_grows():
+    assert _sweep_interval(0) == GOOGLE_SYNC_SWEEP_MAX_INTERVAL
+    intervals = [_sweep_interval(backlog) for backlog in (0, 10, 100, 10_000)]
+    assert intervals == sorted(intervals, reverse=True)
+    assert intervals[0] > intervals[-1]
@@ -0,0 +1,15 @@
+from apps.dialog.intent import detect_intent
+
+
+def test_detect_intent_matches_keyword_prefixes():
+    assert detect_intent("I want to book an appointment") == "book"
+    assert detect_intent("booking please") == "book"
+    assert detect_intent("it was cancelled") == "cancel"
+    assert detect_intent("Yes") == "confirm"
+
+
+def test_detect_intent_short_keywords_need_whole_words():
+    assert detect_intent("no") == "cancel"
+    assert detect_intent("can I come now") == "clarify"
+    assert detect_intent("I know") == "clarify"
+    assert detect_intent("yesterday") == "clarify"
@@ -5,11 +5,23 @@ import pytest
 from django.utils import timezone
 
 from apps.channels.models import OutboxMessage
+from apps.clinics.models import Clinic
+from apps.conversations.models import Conversation
+from apps.patients.models import Patient
+from apps.webhooks.models import LeadWebhookEvent
+from apps.workers.tasks import process_lead_webhook
 
 pytestmark = pytest.mark.django_db
 
 
-def test_lead_webhook_queues_hsm(client, clinic, hmac_signature):
+@pytest.fixture(autouse=True)
+def inline_lead_task(monkeypatch):
+    monkeypatch.setattr(process_lead_webhook, "delay", process_lead_webhook)
+
+
+def test_lead_webhook_queues_hsm(
+    client, clinic, hmac_signature, django_capture_on_commit_callbacks
+):
     payload = {
         "clinic": clinic.slug,
         "lead_id": "lead-123",
@@ -20,16 +32,91 @@ def test_lead_webhook_queues_hsm(client, clinic, hmac_signature):
     body = json.dumps(payload).encode()
     signature = hmac_signature(body)
 
-    response = client.post(
-        "/webhooks/lead",
-        data=body,
-        content_type="application/json",
-        HTTP_X_LEAD_SIGNATURE=signature,
-    )
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            "/webhooks/lead",
+            data=body,
+            content_type="application/json",
+            HTTP_X_LEAD_SIGNATURE=signature,
+        )
 
-    assert response.status_code == 200
+    assert response.status_code == 202
     assert response.json()["ok"] is True
 
     outbox = OutboxMessage.objects.order_by("-created_at").first()
     delta = outbox.scheduled_for - timezone.now()
     assert delta.total_seconds() <= 10
+
+
+def test_lead_webhook_upserts_participants(
+    client, hmac_signature, django_capture_on_commit_callbacks
+):
+    clinic = Clinic.objects.create(slug="leads", name="Lead Dental", tz="UTC", default_lang="en")
+
+    def post(lead_id):
+        body = json.dumps(
+            {"clinic": clinic.slug, "lead_id": lead_id, "name": "Jane", "phone": "+1 555 555 0199"}
+        ).encode()
+        with django_capture_on_commit_callbacks(execute=True):
+            return client.post(
+                "/webhooks/lead",
+                data=body,
+                content_type="application/json",
+                HTTP_X_LEAD_SIGNATURE=hmac_signature(body),
+            )
+
+    assert post("lead-1").status_code == 202
+    assert post("lead-1").status_code == 200  # replay of a processed event
+    assert post("lead-2").status_code == 202  # new lead for a known patient
+
+    events = LeadWebhookEvent.objects.filter(clinic=clinic)
+    assert events.count() == 2
+    assert all(event.processed for event in events)
+    assert Patient.objects.filter(clinic=clinic, normalized_phone="+15555550199").count() == 1
+    conversation = Conversation.objects.get(clinic=clinic)
+    assert conversation.patient.normalized_phone == "+15555550199"
+    assert {event.related_conversation_id for event in events} == {conversation.id}
+
+
+def test_lead_welcome_is_queued_once_per_event():
+    clinic = Clinic.objects.create(slug="lead-once", name="Lead Dental", tz="UTC", default_lang="en")
+    event = LeadWebhookEvent.objects.create(
+        clinic=clinic,
+        dedupe_key="lead-once:lead-9",
+        payload={"name": "Jane", "phone": "+15555550177"},
+    )
+
+    assert process_lead_webhook(event.id) == "processed"
+    # a second run that got past the processed check before the first one committed
+    LeadWebhookEvent.objects.filter(id=event.id).update(processed=False)
+    assert process_lead_webhook(event.id) == "processed"
+    assert process_lead_webhook(event.id) == "already_processed"
+
+    assert OutboxMessage.objects.filter(conversation__clinic=clinic).count() == 1
+    assert OutboxMessage.objects.get().idempotency_key == f"lead-welcome:{event.id}"
+
+
+def test_lead_webhook_rejects_dedupe_key_of_another_clinic(
+    client, hmac_signature, django_capture_on_commit_callbacks
+):
+    first = Clinic.objects.create(slug="lead-a", name="Lead A", tz="UTC", default_lang="en")
+    second = Clinic.objects.create(slug="lead-b", name="Lead B", tz="UTC", default_lang="en")
+
+    def post(clinic):
+        body = json.dumps(
+            {"clinic": clinic.slug, "lead_id": "shared-7", "name": "Jane", "phone": "+15555550188"}
+        ).encode()
+        with django_capture_on_commit_callbacks(execute=True):
+            return client.post(
+                "/webhooks/lead",
+                data=body,
+                content_type="application/json",
+                HTTP_X_LEAD_SIGNATURE=hmac_signature(body),
+            )
+
+    assert post(first).status_code == 202
+    response = post(second)
+
+    assert response.status_code == 409
+    assert response.json() == {"ok": False, "error": "dedupe key conflict"}
+    assert not Patient.objects.filter(clinic=second).exists()
@@ -1,12 +1,19 @@
+from contextlib import nullcontext
 from datetime import timedelta
+from decimal import Decimal
 from types import SimpleNamespace
 
+import orjson
 import pytest
+import requests
+from django.core.cache import cache
 
-from apps.clinics.models import LanguageChoices
+from apps.clinics.models import Clinic, LanguageChoices
 from apps.kb.models import KnowledgeChunk, KnowledgeDocument, KnowledgeIndex
-from apps.llm.models import RetrievalLog
-from apps.llm.router import LLMRouter
+from apps.kb.services import bump_kb_version, kb_version
+from apps.llm.models import LLMRequestLog, RetrievalLog
+from apps.llm.router import LLMRouter, _active_index_id
+from apps.workers.tasks import warm_llm_budget_counter
 
 pytestmark = pytest.mark.django_db
 
@@ -33,17 +40,132 @@ def test_rag_response_grounded(monkeypatch, clinic, settings):
 
     called = {}
 
-    def fake_post(url, json=None, headers=None, timeout=None):
+    def fake_post(url, json=None, headers=None, timeout=None, stream=False):
         called["payload"] = json
-        return SimpleNamespace(status_code=200, json=lambda: {
-            "choices": [{"message": {"content": "It takes 60 minutes."}}]
-        })
+        events = [
+            {"id": "cmpl-1", "choices": [{"delta": {"content": "It takes "}}]},
+            {
+                "id": "cmpl-1",
+                "choices": [{"delta": {"content": "60 minutes."}, "finish_reason": "stop"}],
+            },
+        ]
+        lines = [b"data: " + orjson.dumps(event) for event in events] + [b"", b"data: [DONE]"]
+        return nullcontext(SimpleNamespace(status_code=200, iter_lines=lambda: iter(lines)))
 
-    monkeypatch.setattr("apps.llm.router.requests.post", fake_post)
+    monkeypatch.setattr("apps.llm.router._session.post", fake_post)
 
     router = LLMRouter()
     answer = router.answer(clinic=clinic, language="en", prompt="How long is a root canal?", conversation_id=None)
 
     assert "Root canal takes 60 minutes." in called["payload"]["messages"][1]["content"]
     assert answer == "It takes 60 minutes."
+    assert called["payload"]["stream"] is True
+    log = LLMRequestLog.objects.get()
+    assert log.response_metadata["finish_reason"] == "stop"
     assert RetrievalLog.objects.count() == 1
+
+    # a repeat of the same question is served from the answer cache
+    called.clear()
+    assert router.answer(clinic=clinic, language="en", prompt="How long is a root canal?") == answer
+    assert "payload" not in called
+
+    bump_kb_version(clinic.id)
+    router.answer(clinic=clinic, language="en", prompt="How long is a root canal?")
+    assert "payload" in called
+
+
+def test_budget_total_cached_and_incremented(settings, django_assert_num_queries):
+    settings.LLM_COST_BUDGET_PER_DAY = 0.004
+    settings.LLM_COST_PER_REQUEST = 0.002
+    cache.clear()
+    LLMRequestLog.objects.create(model="deepseek-chat", prompt="p", cost_estimate=Decimal("0.002"))
+
+    router = LLMRouter()
+    assert router._budget_available()
+
+    router._record_spend()
+    with django_assert_num_queries(0):
+        assert not router._budget_available()
+
+
+@pytest.mark.parametrize(
+    "lines",
+    [
+        [b'data: {"choices": [{"delta": {"content": "It "}}]}', requests.exceptions.ChunkedEncodingError()],
+        [b"data: {not json"],
+    ],
+)
+def test_broken_stream_is_a_provider_error(monkeypatch, lines):
+    def iter_lines():
+        for line in lines:
+            if isinstance(line, Exception):
+                raise line
+            yield line
+
+    monkeypatch.setattr(
+        "apps.llm.router._session.post",
+        lambda *args, **kwargs: nullcontext(SimpleNamespace(status_code=200, iter_lines=iter_lines)),
+    )
+
+    reply = LLMRouter()._post([{"role": "user", "content": "hi"}])
+
+    assert reply.status_code == 502
+    assert reply.error_text
+
+
+def test_worker_boot_seeds_budget_counter_for_router(settings, django_assert_num_queries):
+    settings.LLM_COST_BUDGET_PER_DAY = 0.004
+    settings.LLM_COST_PER_REQUEST = 0.002
+    LLMRequestLog.objects.create(model="deepseek-chat", prompt="p", cost_estimate=Decimal("0.004"))
+
+    warm_llm_budget_counter()
+
+    with django_assert_num_queries(0):
+        assert not LLMRouter()._budget_available()
+
+
+def test_retrieval_prefers_requested_language_then_fills(settings):
+    settings.RAG_TOP_K = 3
+    clinic = Clinic.objects.create(slug="rag", name="RAG Dental", tz="UTC", default_lang="en")
+    index = KnowledgeIndex.objects.create(clinic=clinic, name="default")
+    for language, scores in (("ar", [0.9, 0.8]), ("en", [0.5, 0.4])):
+        document = KnowledgeDocument.objects.create(
+            clinic=clinic, language=language, title=f"FAQ {language}", body="..."
+        )
+        index.documents.add(document)
+        for idx, score in enumerate(scores):
+            KnowledgeChunk.objects.create(
+                document=document,
+                chunk_index=idx,
+                content=f"{language}-{idx}",
+                language=language,
+                score=score,
+            )
+
+    chunks = LLMRouter()._retrieve_chunks(clinic, "en")
+
+    assert [chunk.content for chunk in chunks] == ["en-0", "en-1", "ar-0"]
+
+
+def test_deactivating_index_invalidates_cached_index_id(django_capture_on_commit_callbacks):
+    clinic = Clinic.objects.create(slug="kb-swap", name="KB Dental", tz="UTC", default_lang="en")
+    index = KnowledgeIndex.objects.create(clinic=clinic, name="default")
+    assert _active_index_id(clinic.id, "default") == index.id
+
+    with django_capture_on_commit_callbacks(execute=True):
+        index.is_active = False
+        index.save(update_fields=["is_active", "updated_at"])
+
+    assert _active_index_id(clinic.id, "default") is None
+
+
+def test_index_membership_change_bumps_kb_version(django_capture_on_commit_callbacks):
+    clinic = Clinic.objects.create(slug="kb-link", name="KB Dental", tz="UTC", default_lang="en")
+    index = KnowledgeIndex.objects.create(clinic=clinic, name="default")
+    document = KnowledgeDocument.objects.create(clinic=clinic, title="FAQ", body="Hours")
+    version = kb_version(clinic.id)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        index.documents.add(document)
+
+    assert kb_version(clinic.id) != version
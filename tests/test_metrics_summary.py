@@ -0,0 +1,159 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.channels.models import OutboxMessage, OutboxStatus
+from apps.clinics.models import Clinic
+from apps.conversations.models import Conversation, ConversationMessage, MessageDirection
+from apps.dialog.orchestrator import DialogOrchestrator
+from apps.http_api.views import (
+    METRICS_SUMMARY_CACHE_KEY,
+    _average_ttfr,
+    _delivery_fail_rate,
+    _grounded_answer_rate,
+    _intent_accuracy,
+    metrics_summary,
+)
+from apps.kb.models import KnowledgeChunk, KnowledgeDocument
+from apps.llm.models import LLMRequestLog, RetrievalLog
+
+pytestmark = pytest.mark.django_db
+
+
+def _message(conversation, direction, created_at):
+    message = ConversationMessage.objects.create(
+        conversation=conversation, direction=direction, body="hi"
+    )
+    ConversationMessage.objects.filter(pk=message.pk).update(created_at=created_at)
+
+
+def test_average_ttfr_uses_first_reply_per_conversation():
+    clinic = Clinic.objects.create(name="Metrics Clinic", slug="metrics", tz="UTC")
+    now = timezone.now()
+    fast = Conversation.objects.create(clinic=clinic, dedupe_key="metrics:1")
+    slow = Conversation.objects.create(clinic=clinic, dedupe_key="metrics:2")
+    unanswered = Conversation.objects.create(clinic=clinic, dedupe_key="metrics:3")
+
+    _message(fast, MessageDirection.INBOUND, now - timedelta(minutes=10))
+    _message(fast, MessageDirection.OUTBOUND, now - timedelta(minutes=9))
+    _message(fast, MessageDirection.OUTBOUND, now - timedelta(minutes=1))
+    _message(slow, MessageDirection.INBOUND, now - timedelta(minutes=10))
+    _message(slow, MessageDirection.OUTBOUND, now - timedelta(minutes=7))
+    _message(unanswered, MessageDirection.INBOUND, now - timedelta(minutes=5))
+
+    assert _average_ttfr(now - timedelta(days=1)) == pytest.approx(120.0)
+
+
+def test_average_ttfr_measures_reply_latency_of_handled_messages(monkeypatch):
+    clinic = Clinic.objects.create(name="Live Clinic", slug="live", tz="UTC")
+    conversation = Conversation.objects.create(clinic=clinic, dedupe_key="live:1")
+    orchestrator = DialogOrchestrator()
+    reply = DialogOrchestrator._reply
+
+    def slow_reply(self, *args, **kwargs):
+        time.sleep(0.05)
+        return reply(self, *args, **kwargs)
+
+    monkeypatch.setattr(DialogOrchestrator, "_reply", slow_reply)
+
+    orchestrator.handle_inbound(conversation, "hello there", "en", llm_result="Hi! How can we help?")
+
+    assert _average_ttfr(timezone.now() - timedelta(days=1)) >= 0.05
+
+
+def test_async_inbound_is_stored_before_the_llm_call(monkeypatch):
+    clinic = Clinic.objects.create(name="Async Clinic", slug="async", tz="UTC")
+    conversation = Conversation.objects.create(clinic=clinic, dedupe_key="async:1")
+    orchestrator = DialogOrchestrator()
+    called_at = []
+
+    async def slow_answer(**kwargs):
+        called_at.append(timezone.now())
+        await asyncio.sleep(0.05)
+        return "Hi! How can we help?"
+
+    monkeypatch.setattr(orchestrator.llm_router, "aanswer", slow_answer)
+
+    response_text, _ = async_to_sync(orchestrator.ahandle_inbound)(conversation, "hello there", "en")
+
+    assert response_text == "Hi! How can we help?"
+    inbound = conversation.messages.get(direction=MessageDirection.INBOUND)
+    assert inbound.created_at < called_at[0]
+    assert _average_ttfr(timezone.now() - timedelta(days=1)) >= 0.05
+
+
+def test_average_ttfr_without_traffic():
+    assert _average_ttfr(timezone.now() - timedelta(days=1)) == 0.0
+
+
+def test_rates_use_conditional_counts():
+    clinic = Clinic.objects.create(name="Rates Clinic", slug="rates", tz="UTC")
+    conversation = Conversation.objects.create(clinic=clinic, dedupe_key="rates:1")
+    for intent in ("book", "clarify", "unknown", "cancel"):
+        ConversationMessage.objects.create(
+            conversation=conversation, direction=MessageDirection.INBOUND, body="x", intent=intent
+        )
+    for status in (OutboxStatus.SENT, OutboxStatus.FAILED, OutboxStatus.PENDING):
+        OutboxMessage.objects.create(clinic=clinic, status=status, scheduled_for=timezone.now())
+
+    cutoff = timezone.now() - timedelta(days=7)
+    assert _intent_accuracy(cutoff) == pytest.approx(0.5)
+    assert _delivery_fail_rate(cutoff) == pytest.approx(0.5)
+
+
+def test_grounded_rate_counts_each_log_once():
+    clinic = Clinic.objects.create(name="Grounded Clinic", slug="grounded", tz="UTC")
+    document = KnowledgeDocument.objects.create(clinic=clinic, title="FAQ", body="text")
+    chunks = [
+        KnowledgeChunk.objects.create(document=document, chunk_index=idx, content="text")
+        for idx in range(2)
+    ]
+    grounded = LLMRequestLog.objects.create(model="deepseek-chat", prompt="q")
+    LLMRequestLog.objects.create(model="deepseek-chat", prompt="q")
+    for chunk in chunks:
+        RetrievalLog.objects.create(llm_log=grounded, chunk=chunk)
+
+    assert _grounded_answer_rate(timezone.now() - timedelta(days=7)) == pytest.approx(0.5)
+
+
+def test_metrics_summary_is_cached(client):
+    cache.delete(METRICS_SUMMARY_CACHE_KEY)
+    first = client.get("/metrics/summary")
+    second = client.get("/metrics/summary")
+    assert first.status_code == 200
+    assert second.json()["generated_at"] == first.json()["generated_at"]
+
+
+def test_metrics_summary_queries_on_the_request_connection(client):
+    # the aggregates share the request's connection, so they see this test's rows
+    clinic = Clinic.objects.create(name="Summary Clinic", slug="summary", tz="UTC")
+    Conversation.objects.create(clinic=clinic, dedupe_key="summary:1", handoff_required=True)
+    Conversation.objects.create(clinic=clinic, dedupe_key="summary:2")
+
+    response = client.get("/metrics/summary")
+
+    assert response.json()["metrics"]["handoff_rate"] == 0.5
+
+
+def test_concurrent_cache_misses_compute_the_summary_once(monkeypatch):
+    calls = []
+
+    async def slow_payload():
+        calls.append(timezone.now())
+        await asyncio.sleep(0.1)
+        return {"ok": True, "generated_at": timezone.now().isoformat(), "metrics": {}}
+
+    monkeypatch.setattr("apps.http_api.views._metrics_summary_payload", slow_payload)
+
+    async def burst():
+        return await asyncio.gather(*(metrics_summary(None) for _ in range(5)))
+
+    responses = asyncio.run(burst())
+
+    assert len(calls) == 1
+    assert len({response.content for response in responses}) == 1
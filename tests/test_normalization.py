@@ -24,3 +24,15 @@ def test_intent_tokens_appended():
     tokens = set(normalized.split())
     assert "intent_price" in tokens
     assert "intent_service" in tokens
+
+
+def test_longest_phrase_replaced_first():
+    assert normalize_text("after tomorrow") == "بعد غد"
+    assert normalize_text("tomorrow today") == "غد اليوم"
+
+
+def test_repeated_bodies_served_from_cache():
+    normalize_text.cache_clear()
+    first = normalize_text("نعم بكرة")
+    assert normalize_text("نعم بكرة") == first
+    assert normalize_text.cache_info().hits == 1
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from apps.appointments.models import Appointment, AppointmentStatus
+from apps.channels.models import HSMTemplate, HSMTemplateStatus, OutboxMessage
+from apps.clinics.models import Clinic, ClinicService
+from apps.conversations.models import Conversation
+from apps.patients.models import Patient
+from apps.workers.tasks import schedule_appointment_reminders
+
+pytestmark = pytest.mark.django_db
+
+
+def _book(clinic, service, idx, start):
+    patient = Patient.objects.create(
+        clinic=clinic,
+        full_name=f"Patient {idx}",
+        phone_number=f"+1555000000{idx}",
+        normalized_phone=f"+1555000000{idx}",
+    )
+    conversation = Conversation.objects.create(
+        clinic=clinic, patient=patient, dedupe_key=f"conv-{idx}"
+    )
+    Appointment.objects.create(
+        clinic=clinic,
+        service=service,
+        patient=patient,
+        slot=(start + timedelta(hours=idx), start + timedelta(hours=idx, minutes=30)),
+        status=AppointmentStatus.BOOKED,
+    )
+    return conversation
+
+
+def _clinic_with_bookings(count):
+    clinic = Clinic.objects.create(slug="clinic", name="Clinic", tz="UTC", default_lang="en")
+    service = ClinicService.objects.create(
+        clinic=clinic, code="clean", name="Cleaning", duration_minutes=30, language="en"
+    )
+    start = timezone.now() + timedelta(hours=12)
+    conversations = [_book(clinic, service, idx, start) for idx in range(count)]
+    HSMTemplate.objects.create(
+        clinic=clinic,
+        name="reminder_2h",
+        language="en",
+        body="See you soon, {{name}}",
+        provider_template_id="tpl-2h",
+        status=HSMTemplateStatus.APPROVED,
+    )
+    return clinic, service, start, conversations
+
+
+def test_reminders_are_built_in_memory_and_inserted_in_bulk(django_assert_num_queries):
+    _, _, _, conversations = _clinic_with_bookings(3)
+
+    # due rows with their conversation ids, one template lookup, one INSERT
+    with django_assert_num_queries(3):
+        assert schedule_appointment_reminders() == 3
+
+    queued = OutboxMessage.objects.order_by("id")
+    assert [outbox.conversation_id for outbox in queued] == [c.id for c in conversations]
+    assert {outbox.hsm_template.name for outbox in queued} == {"reminder_2h"}
+
+    # a second run inserts nothing new: idempotency keys already exist
+    schedule_appointment_reminders()
+    assert OutboxMessage.objects.count() == 3
+
+
+def test_rerun_skips_queued_reminders_and_adds_only_new_ones():
+    clinic, service, start, _ = _clinic_with_bookings(2)
+    assert schedule_appointment_reminders() == 2
+    first = list(OutboxMessage.objects.order_by("id").values_list("id", "scheduled_for"))
+
+    # the rows are rebuilt and submitted again; ignore_conflicts drops them on
+    # the idempotency key, so the queued rows keep their ids and schedule
+    assert schedule_appointment_reminders() == 2
+    assert list(OutboxMessage.objects.order_by("id").values_list("id", "scheduled_for")) == first
+
+    added = _book(clinic, service, 2, start)
+    schedule_appointment_reminders()
+    queued = list(OutboxMessage.objects.order_by("id"))
+    assert [(outbox.id, outbox.scheduled_for) for outbox in queued[:2]] == first
+    assert len(queued) == 3
+    assert queued[2].conversation_id == added.id
@@ -0,0 +1,43 @@
+import hashlib
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from apps.clinics.models import Clinic
+from apps.conversations.models import Conversation, ConversationMessage, MessageDirection
+from apps.workers.tasks import enforce_message_retention
+
+pytestmark = pytest.mark.django_db
+
+
+def test_retention_redacts_stale_messages_in_sql(settings):
+    settings.DATA_RETENTION_DAYS = 30
+    clinic = Clinic.objects.create(slug="demo", name="Demo Dental", tz="UTC", default_lang="en")
+    conversation = Conversation.objects.create(clinic=clinic, dedupe_key="conv-retention")
+    stale = ConversationMessage.objects.create(
+        conversation=conversation,
+        direction=MessageDirection.INBOUND,
+        body="موعدي غدا please",
+        metadata={"source": "whatsapp"},
+    )
+    fresh = ConversationMessage.objects.create(
+        conversation=conversation, direction=MessageDirection.INBOUND, body="keep me"
+    )
+    ConversationMessage.objects.filter(pk=stale.pk).update(
+        created_at=timezone.now() - timedelta(days=31)
+    )
+
+    assert enforce_message_retention() == 1
+    assert enforce_message_retention() == 0
+
+    stale.refresh_from_db()
+    fresh.refresh_from_db()
+    assert stale.body == "[redacted]"
+    assert stale.metadata == {
+        "source": "whatsapp",
+        "redacted": True,
+        "body_hash": hashlib.sha256("موعدي غدا please".encode("utf-8")).hexdigest(),
+        "preview": "موعدي غد",
+    }
+    assert fresh.body == "keep me"
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+from apps.channels.models import WebhookEvent
+from apps.clinics.models import Clinic
+from apps.conversations.models import Conversation, ConversationMessage
+from apps.patients.models import Patient
+
+pytestmark = pytest.mark.django_db
+
+
+def _make_clinic(slug="wa-clinic"):
+    return Clinic.objects.create(slug=slug, name="WhatsApp Clinic", tz="UTC", default_lang="en")
+
+
+def _post_webhook(client, payload):
+    return client.post(
+        "/channels/whatsapp/webhook",
+        data=json.dumps(payload),
+        content_type="application/json",
+    )
+
+
+def test_whatsapp_webhook_processes_batch(client, settings):
+    settings.DEEPSEEK_API_KEY = ""
+    clinic = _make_clinic()
+    payload = {
+        "clinic": clinic.slug,
+        "event_id": "evt-batch-1",
+        "messages": [
+            {"from": "+15555550101", "name": "Jane", "body": "book an appointment"},
+            {"from": "+15555550102", "name": "Omar", "body": "hello", "language": "ar"},
+        ],
+    }
+
+    response = _post_webhook(client, payload)
+
+    assert response.status_code == 200
+    assert response.json()["ok"] is True
+    assert WebhookEvent.objects.filter(provider_event_id="evt-batch-1").exists()
+    assert Patient.objects.filter(clinic=clinic).count() == 2
+    assert Conversation.objects.filter(clinic=clinic).count() == 2
+    assert ConversationMessage.objects.filter(direction="inbound").count() == 2
+
+
+def test_whatsapp_webhook_rejects_get(client):
+    response = client.get("/channels/whatsapp/webhook")
+    assert response.status_code == 405
+
+
+def test_whatsapp_webhook_unknown_clinic(client):
+    response = _post_webhook(client, {"clinic": "missing", "messages": []})
+    assert response.status_code == 404
+    assert response.json() == {"ok": False, "error": "clinic not found"}
+
+
+def test_whatsapp_webhook_reuses_existing_participants(client, settings):
+    settings.DEEPSEEK_API_KEY = ""
+    clinic = _make_clinic("wa-repeat")
+    patient = Patient.objects.create(
+        clinic=clinic,
+        full_name="Existing",
+        phone_number="+15555550103",
+        normalized_phone="+15555550103",
+    )
+    conversation = Conversation.objects.create(
+        clinic=clinic, dedupe_key=f"{clinic.slug}:+15555550103"
+    )
+    payload = {
+        "clinic": clinic.slug,
+        "messages": [
+            {"from": "+15555550103", "body": "hello"},
+            {"from": "+15555550103", "body": "hello again"},
+            {"from": "", "body": "no sender"},
+        ],
+    }
+
+    response = _post_webhook(client, payload)
+
+    assert response.status_code == 200
+    assert Patient.objects.filter(clinic=clinic).count() == 1
+    assert Conversation.objects.filter(clinic=clinic).count() == 1
+    conversation.refresh_from_db()
+    assert conversation.patient_id == patient.id
+    assert conversation.messages.filter(direction="inbound").count() == 2
+
+
+def test_whatsapp_webhook_skips_status_only_entries(client, monkeypatch):
+    clinic = _make_clinic("wa-status")
+    calls = []
+
+    async def fake_handle(self, conversation, body, language):
+        calls.append(body)
+        return "", "unknown"
+
+    monkeypatch.setattr("apps.dialog.orchestrator.DialogOrchestrator.ahandle_inbound", fake_handle)
+    payload = {
+        "clinic": clinic.slug,
+        "messages": [
+            {"from": "+15555550104", "status": "read"},
+            {"from": "+15555550105", "body": "   "},
+            {"from": "+15555550106", "body": " hello "},
+        ],
+    }
+
+    response = _post_webhook(client, payload)
+
+    assert response.status_code == 200
+    assert calls == ["hello"]
+    assert list(Patient.objects.filter(clinic=clinic).values_list("normalized_phone", flat=True)) == [
+        "+15555550106"
+    ]
+
+
+def test_whatsapp_webhook_acknowledges_batch_when_one_message_fails(client, monkeypatch, caplog):
+    clinic = _make_clinic("wa-partial")
+    handled = []
+
+    async def fake_handle(self, conversation, body, language):
+        if body == "boom":
+            raise RuntimeError("orchestrator failed")
+        handled.append(body)
+        return "", "unknown"
+
+    monkeypatch.setattr("apps.dialog.orchestrator.DialogOrchestrator.ahandle_inbound", fake_handle)
+    payload = {
+        "clinic": clinic.slug,
+        "messages": [
+            {"id": "wamid-1", "from": "+15555550107", "body": "boom"},
+            {"id": "wamid-2", "from": "+15555550108", "body": "hello"},
+        ],
+    }
+
+    response = _post_webhook(client, payload)
+
+    assert response.status_code == 200
+    assert handled == ["hello"]
+    assert [record.message for record in caplog.records] == ["whatsapp.message_failed"]
+    assert caplog.records[0].message_id == "wamid-1"